@@ -0,0 +1,51 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from billing_app.models.database import engine, Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    # Keep the running server's loggers when migrations run in-process
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# Search tables are created with raw SQL (FTS5 virtual tables and their shadow tables on SQLite),
+# so they have no models and autogenerate must not try to drop them
+UNMANAGED_TABLE_PREFIXES = ("invoice_search", "invoice_number_search")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    table_name = name if type_ == "table" else getattr(getattr(object, "table", None), "name", None)
+    return not (table_name and table_name.startswith(UNMANAGED_TABLE_PREFIXES))
+
+
+def run_migrations_offline():
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        # Batch mode lets ALTER COLUMN work on SQLite
+        context.configure(
+            connection=connection, target_metadata=target_metadata, render_as_batch=True,
+            include_object=include_object
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
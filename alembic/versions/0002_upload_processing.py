@@ -0,0 +1,32 @@
+"""track post-upload processing on stored files
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("file_storage") as batch:
+        batch.add_column(sa.Column("processing_status", sa.String()))
+        batch.add_column(sa.Column("detected_type", sa.String()))
+        batch.add_column(sa.Column("thumbnail_path", sa.String()))
+        batch.add_column(sa.Column("file_metadata", sa.Text()))
+        batch.add_column(sa.Column("processed_at", sa.DateTime(timezone=True)))
+
+
+def downgrade():
+    with op.batch_alter_table("file_storage") as batch:
+        batch.drop_column("processed_at")
+        batch.drop_column("file_metadata")
+        batch.drop_column("thumbnail_path")
+        batch.drop_column("detected_type")
+        batch.drop_column("processing_status")
@@ -0,0 +1,35 @@
+"""bulk invoice import jobs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("file_id", sa.Integer(), sa.ForeignKey("file_storage.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", sa.String()),
+        sa.Column("processed_rows", sa.Integer()),
+        sa.Column("imported_count", sa.Integer()),
+        sa.Column("error_count", sa.Integer()),
+        sa.Column("error_report_path", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("finished_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_import_jobs_id", "import_jobs", ["id"])
+
+
+def downgrade():
+    op.drop_table("import_jobs")
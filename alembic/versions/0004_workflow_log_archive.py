@@ -0,0 +1,41 @@
+"""workflow history indexes and archive table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_workflow_logs_invoice_id_created_at", "workflow_logs", ["invoice_id", "created_at"])
+    op.create_index("ix_workflow_logs_created_at", "workflow_logs", ["created_at"])
+
+    op.create_table(
+        "workflow_logs_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("invoice_id", sa.Integer(), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("from_status", sa.String()),
+        sa.Column("to_status", sa.String()),
+        sa.Column("user_id", sa.Integer()),
+        sa.Column("notes", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_workflow_logs_archive_invoice_id_created_at", "workflow_logs_archive", ["invoice_id", "created_at"]
+    )
+    op.create_index("ix_workflow_logs_archive_created_at", "workflow_logs_archive", ["created_at"])
+
+
+def downgrade():
+    op.drop_table("workflow_logs_archive")
+    op.drop_index("ix_workflow_logs_created_at", table_name="workflow_logs")
+    op.drop_index("ix_workflow_logs_invoice_id_created_at", table_name="workflow_logs")
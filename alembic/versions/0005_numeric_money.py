@@ -0,0 +1,44 @@
+"""store money and quantities as exact decimals
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+MONEY = sa.Numeric(12, 2)
+QUANTITY = sa.Numeric(12, 3)
+
+
+def upgrade():
+    with op.batch_alter_table("invoices") as batch:
+        batch.alter_column("total_amount", type_=MONEY, existing_type=sa.Float(), existing_nullable=False,
+                           postgresql_using="round(total_amount::numeric, 2)")
+        batch.alter_column("tax_amount", type_=MONEY, existing_type=sa.Float(),
+                           postgresql_using="round(tax_amount::numeric, 2)")
+
+    with op.batch_alter_table("invoice_items") as batch:
+        batch.alter_column("quantity", type_=QUANTITY, existing_type=sa.Float(), existing_nullable=False,
+                           postgresql_using="round(quantity::numeric, 3)")
+        batch.alter_column("unit_price", type_=MONEY, existing_type=sa.Float(), existing_nullable=False,
+                           postgresql_using="round(unit_price::numeric, 2)")
+        batch.alter_column("total_price", type_=MONEY, existing_type=sa.Float(), existing_nullable=False,
+                           postgresql_using="round(total_price::numeric, 2)")
+
+
+def downgrade():
+    with op.batch_alter_table("invoice_items") as batch:
+        batch.alter_column("total_price", type_=sa.Float(), existing_type=MONEY, existing_nullable=False)
+        batch.alter_column("unit_price", type_=sa.Float(), existing_type=MONEY, existing_nullable=False)
+        batch.alter_column("quantity", type_=sa.Float(), existing_type=QUANTITY, existing_nullable=False)
+
+    with op.batch_alter_table("invoices") as batch:
+        batch.alter_column("tax_amount", type_=sa.Float(), existing_type=MONEY)
+        batch.alter_column("total_amount", type_=sa.Float(), existing_type=MONEY, existing_nullable=False)
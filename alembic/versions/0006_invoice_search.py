@@ -0,0 +1,54 @@
+"""invoice full-text search index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("""
+            CREATE TABLE invoice_search (
+                invoice_id INTEGER PRIMARY KEY REFERENCES invoices(id) ON DELETE CASCADE,
+                invoice_number TEXT NOT NULL,
+                document TSVECTOR NOT NULL
+            )
+        """)
+        op.execute("""
+            INSERT INTO invoice_search (invoice_id, invoice_number, document)
+            SELECT i.id, i.invoice_number,
+                   setweight(to_tsvector('simple', i.invoice_number), 'A') ||
+                   setweight(to_tsvector('simple', coalesce(u.full_name, '') || ' ' || u.email), 'B') ||
+                   setweight(to_tsvector('simple', coalesce(i.description, '')), 'C')
+            FROM invoices i JOIN users u ON u.id = i.customer_id
+        """)
+        op.execute("CREATE INDEX ix_invoice_search_document ON invoice_search USING GIN (document)")
+        op.execute(
+            "CREATE INDEX ix_invoice_search_invoice_number_trgm "
+            "ON invoice_search USING GIN (invoice_number gin_trgm_ops)"
+        )
+    else:
+        op.execute("""
+            CREATE VIRTUAL TABLE invoice_search USING fts5(
+                invoice_number, description, customer_name, customer_email,
+                tokenize = 'unicode61', prefix = '2 3 4'
+            )
+        """)
+        op.execute("""
+            INSERT INTO invoice_search (rowid, invoice_number, description, customer_name, customer_email)
+            SELECT i.id, i.invoice_number, coalesce(i.description, ''), coalesce(u.full_name, ''), u.email
+            FROM invoices i JOIN users u ON u.id = i.customer_id
+        """)
+
+
+def downgrade():
+    op.execute("DROP TABLE invoice_search")
@@ -0,0 +1,109 @@
+"""tenants and tenant-scoped indexes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+TENANT_TABLES = ["users", "invoices", "file_storage"]
+
+
+def upgrade():
+    op.create_table(
+        "tenants",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("slug", sa.String(), nullable=False),
+        sa.Column("database_url", sa.String()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_tenants_id", "tenants", ["id"])
+    op.create_index("ix_tenants_slug", "tenants", ["slug"], unique=True)
+    op.execute("INSERT INTO tenants (id, name, slug, is_active) VALUES (1, 'Default', 'default', true)")
+
+    # Existing rows belong to the default tenant
+    for table in TENANT_TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(sa.Column("tenant_id", sa.Integer(), nullable=False, server_default="1"))
+            batch.create_foreign_key(f"fk_{table}_tenant_id", "tenants", ["tenant_id"], ["id"])
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column("tenant_id", server_default=None, existing_type=sa.Integer(), existing_nullable=False)
+
+    op.create_index("ix_users_tenant_id_id", "users", ["tenant_id", "id"])
+
+    # Invoice numbers are unique per tenant instead of globally
+    op.drop_index("ix_invoices_invoice_number", table_name="invoices")
+    op.create_index("uq_invoices_tenant_id_invoice_number", "invoices", ["tenant_id", "invoice_number"], unique=True)
+    op.create_index("ix_invoices_tenant_id_id", "invoices", ["tenant_id", "id"])
+    op.create_index("ix_invoices_tenant_id_customer_id", "invoices", ["tenant_id", "customer_id"])
+
+    op.create_index("ix_file_storage_tenant_id_user_id", "file_storage", ["tenant_id", "user_id"])
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        op.add_column("invoice_search", sa.Column("tenant_id", sa.Integer()))
+        op.execute("""
+            UPDATE invoice_search s SET tenant_id = i.tenant_id
+            FROM invoices i WHERE i.id = s.invoice_id
+        """)
+        op.alter_column("invoice_search", "tenant_id", nullable=False)
+        op.drop_index("ix_invoice_search_document", table_name="invoice_search")
+        op.execute("CREATE INDEX ix_invoice_search_tenant_id_document ON invoice_search USING GIN (tenant_id, document)")
+    else:
+        # FTS5 tables cannot be altered; rebuild with a tenant column
+        op.execute("DROP TABLE invoice_search")
+        op.execute("""
+            CREATE VIRTUAL TABLE invoice_search USING fts5(
+                invoice_number, description, customer_name, customer_email, tenant,
+                tokenize = 'unicode61', prefix = '2 3 4'
+            )
+        """)
+        op.execute("""
+            INSERT INTO invoice_search (rowid, invoice_number, description, customer_name, customer_email, tenant)
+            SELECT i.id, i.invoice_number, coalesce(i.description, ''), coalesce(u.full_name, ''), u.email,
+                   't' || i.tenant_id
+            FROM invoices i JOIN users u ON u.id = i.customer_id
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_invoice_search_tenant_id_document", table_name="invoice_search")
+        op.execute("CREATE INDEX ix_invoice_search_document ON invoice_search USING GIN (document)")
+        op.drop_column("invoice_search", "tenant_id")
+    else:
+        op.execute("DROP TABLE invoice_search")
+        op.execute("""
+            CREATE VIRTUAL TABLE invoice_search USING fts5(
+                invoice_number, description, customer_name, customer_email,
+                tokenize = 'unicode61', prefix = '2 3 4'
+            )
+        """)
+        op.execute("""
+            INSERT INTO invoice_search (rowid, invoice_number, description, customer_name, customer_email)
+            SELECT i.id, i.invoice_number, coalesce(i.description, ''), coalesce(u.full_name, ''), u.email
+            FROM invoices i JOIN users u ON u.id = i.customer_id
+        """)
+
+    op.drop_index("ix_file_storage_tenant_id_user_id", table_name="file_storage")
+    op.drop_index("ix_invoices_tenant_id_customer_id", table_name="invoices")
+    op.drop_index("ix_invoices_tenant_id_id", table_name="invoices")
+    op.drop_index("uq_invoices_tenant_id_invoice_number", table_name="invoices")
+    op.create_index("ix_invoices_invoice_number", "invoices", ["invoice_number"], unique=True)
+    op.drop_index("ix_users_tenant_id_id", table_name="users")
+
+    for table in reversed(TENANT_TABLES):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f"fk_{table}_tenant_id", type_="foreignkey")
+            batch.drop_column("tenant_id")
+
+    op.drop_table("tenants")
@@ -0,0 +1,72 @@
+"""subscriptions and billing runs
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "subscriptions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id"), nullable=False),
+        sa.Column("customer_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("interval_unit", sa.String(), nullable=False),
+        sa.Column("interval_count", sa.Integer(), nullable=False),
+        sa.Column("next_run_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime()),
+        sa.Column("tax_rate_bp", sa.Integer()),
+        sa.Column("due_days", sa.Integer()),
+        sa.Column("description", sa.Text()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_subscriptions_id", "subscriptions", ["id"])
+    op.create_index("ix_subscriptions_tenant_id_next_run_date", "subscriptions", ["tenant_id", "next_run_date"])
+
+    op.create_table(
+        "subscription_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("subscription_id", sa.Integer(), sa.ForeignKey("subscriptions.id"), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("quantity", sa.Numeric(12, 3), nullable=False),
+        sa.Column("unit_price", sa.Numeric(12, 2), nullable=False),
+    )
+    op.create_index("ix_subscription_items_id", "subscription_items", ["id"])
+    op.create_index("ix_subscription_items_subscription_id", "subscription_items", ["subscription_id"])
+
+    op.create_table(
+        "billing_runs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id"), nullable=False),
+        sa.Column("period_end", sa.DateTime(), nullable=False),
+        sa.Column("status", sa.String()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("subscriptions_processed", sa.Integer()),
+        sa.Column("invoices_generated", sa.Integer()),
+        sa.Column("failed_count", sa.Integer()),
+        sa.Column("elapsed_seconds", sa.Float()),
+        sa.Column("invoices_per_second", sa.Float()),
+        sa.Column("error", sa.Text()),
+        sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("checkpoint_at", sa.DateTime(timezone=True)),
+        sa.Column("finished_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_billing_runs_id", "billing_runs", ["id"])
+
+
+def downgrade():
+    op.drop_table("billing_runs")
+    op.drop_table("subscription_items")
+    op.drop_table("subscriptions")
@@ -0,0 +1,32 @@
+"""anchor subscription schedules to their start date
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.add_column(sa.Column("anchor_date", sa.DateTime()))
+        batch.add_column(sa.Column("billed_cycles", sa.Integer(), nullable=False, server_default="0"))
+
+    # Existing schedules restart counting from their next run date
+    op.execute("UPDATE subscriptions SET anchor_date = next_run_date")
+
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.alter_column("anchor_date", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.drop_column("billed_cycles")
+        batch.drop_column("anchor_date")
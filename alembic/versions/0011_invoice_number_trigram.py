@@ -0,0 +1,34 @@
+"""trigram index for invoice number fragments on SQLite
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Postgres already matches fragments through the pg_trgm index from 0006
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    op.execute("""
+        CREATE VIRTUAL TABLE invoice_number_search USING fts5(
+            invoice_number, tenant_id UNINDEXED, tokenize = 'trigram'
+        )
+    """)
+    op.execute("""
+        INSERT INTO invoice_number_search (rowid, invoice_number, tenant_id)
+        SELECT id, invoice_number, tenant_id FROM invoices
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    op.execute("DROP TABLE invoice_number_search")
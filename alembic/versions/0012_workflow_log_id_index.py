@@ -0,0 +1,23 @@
+"""index workflow logs on (invoice_id, id) for keyset history pages
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_workflow_logs_invoice_id_id", "workflow_logs", ["invoice_id", "id"])
+    op.create_index("ix_workflow_logs_archive_invoice_id_id", "workflow_logs_archive", ["invoice_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_workflow_logs_archive_invoice_id_id", table_name="workflow_logs_archive")
+    op.drop_index("ix_workflow_logs_invoice_id_id", table_name="workflow_logs")
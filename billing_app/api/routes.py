@@ -1,22 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Request, Response, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List, Optional
+import re
 import uuid
 import os
 import aiofiles
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from billing_app.models.database import get_db, User, Invoice, InvoiceItem, WorkflowLog, FileStorage
+from billing_app.config import get_settings
+from billing_app.models.database import (
+    get_db, Tenant, User, Invoice, InvoiceItem, WorkflowLog, FileStorage, ImportJob,
+    Subscription, SubscriptionItem, BillingRun
+)
 from billing_app.models.schemas import (
-    UserCreate, User as UserSchema, Token, InvoiceCreate, Invoice as InvoiceSchema,
-    InvoiceUpdate, WorkflowLogCreate, FileUploadResponse
+    UserCreate, User as UserSchema, Token, TenantInvite, InvoiceCreate, Invoice as InvoiceSchema,
+    InvoiceUpdate, WorkflowLogCreate, FileUploadResponse, ImportJobCreate, ImportJob as ImportJobSchema,
+    WorkflowHistoryPage, SubscriptionCreate, Subscription as SubscriptionSchema,
+    BillingRunCreate, BillingRun as BillingRunSchema
+)
+from billing_app.auth.auth_handler import (
+    auth_handler, get_current_verified_user, get_current_user_for_read, get_current_verified_user_for_read
 )
-from billing_app.auth.auth_handler import auth_handler, get_current_active_user, get_current_verified_user
 from billing_app.workflow.engine import WorkflowEngine
+from billing_app.cache.response_cache import ResponseCache, invoice_cache
+from billing_app.storage.file_manager import file_storage
+from billing_app.storage.processing import upload_processor, types_compatible
+from billing_app.imports.invoice_import import invoice_importer
+from billing_app.money.totals import TotalsCalculator, quantize_amount, quantize_quantity
+from billing_app.search.invoice_search import invoice_search
+from billing_app.tenancy.session import get_tenant_db, get_tenant_read_db
+from billing_app.recurring.billing_cycle import recurring_billing
 
 router = APIRouter()
 
+def _create_tenant(db: Session, name: str) -> Tenant:
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "tenant"
+    tenant = Tenant(name=name, slug=f"{slug[:40]}-{uuid.uuid4().hex[:8]}", is_active=True)
+    db.add(tenant)
+    db.flush()
+    return tenant
+
 # Authentication endpoints
 @router.post("/auth/register", response_model=UserSchema)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -35,6 +61,16 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
             detail="Username already taken"
         )
     
+    # An invite joins an existing tenant; otherwise the signup starts its own
+    if user.invite_token:
+        tenant = db.query(Tenant).filter(
+            Tenant.id == auth_handler.verify_invite_token(user.invite_token)
+        ).first()
+        if tenant is None or not tenant.is_active:
+            raise HTTPException(status_code=400, detail="Invalid or expired invite")
+    else:
+        tenant = _create_tenant(db, user.organization or user.username)
+    
     # Create new user
     hashed_password = auth_handler.get_password_hash(user.password)
     verification_token = str(uuid.uuid4())
@@ -44,7 +80,8 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         email=user.email,
         full_name=user.full_name,
         hashed_password=hashed_password,
-        verification_token=verification_token
+        verification_token=verification_token,
+        tenant_id=tenant.id
     )
     
     db.add(db_user)
@@ -63,7 +100,7 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = D
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")))
+    access_token_expires = timedelta(minutes=get_settings().access_token_expire_minutes)
     access_token = auth_handler.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
@@ -83,45 +120,66 @@ def verify_user(token: str, db: Session = Depends(get_db)):
     return {"message": "User verified successfully"}
 
 @router.get("/auth/me", response_model=UserSchema)
-def read_users_me(current_user: User = Depends(get_current_active_user)):
-    return current_user
+def read_users_me(request: Request, current_user: User = Depends(get_current_user_for_read)):
+    etag = ResponseCache.make_etag("user", current_user.id, current_user.version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if ResponseCache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = UserSchema.model_validate(current_user).model_dump_json()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Tenant endpoints
+@router.post("/tenants/invites", response_model=TenantInvite)
+def create_tenant_invite(current_user: User = Depends(get_current_verified_user)):
+    return TenantInvite(
+        invite_token=auth_handler.create_invite_token(current_user.tenant_id),
+        expires_in=get_settings().invite_expire_hours * 3600
+    )
 
 # Invoice endpoints
 @router.post("/invoices", response_model=InvoiceSchema)
 def create_invoice(
     invoice: InvoiceCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tenant_db),
     current_user: User = Depends(get_current_verified_user)
 ):
-    # Calculate total from items
-    total_from_items = sum(item.quantity * item.unit_price for item in invoice.items)
+    # Customers are looked up within the current tenant only
+    if db.query(User.id).filter(User.id == invoice.customer_id).first() is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Calculate totals in exact minor units and check them against the submitted total
+    totals = TotalsCalculator.for_invoices([invoice])
+    mismatch = TotalsCalculator.reconcile([invoice], totals)[0] or TotalsCalculator.check_limits(totals)[0]
+    if mismatch:
+        raise HTTPException(status_code=422, detail=mismatch)
     
     # Create invoice
     db_invoice = Invoice(
         invoice_number=invoice.invoice_number,
         customer_id=invoice.customer_id,
-        total_amount=total_from_items,
-        tax_amount=invoice.tax_amount,
+        total_amount=totals.subtotal(0),
+        tax_amount=totals.tax(0),
         due_date=invoice.due_date,
         description=invoice.description,
         status="draft"
     )
     
+    # Flush for the id; the invoice, its items and its index entry commit together
     db.add(db_invoice)
-    db.commit()
-    db.refresh(db_invoice)
+    db.flush()
     
     # Create invoice items
-    for item in invoice.items:
+    for i, item in enumerate(invoice.items):
         db_item = InvoiceItem(
             invoice_id=db_invoice.id,
             description=item.description,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            total_price=item.quantity * item.unit_price
+            quantity=quantize_quantity(item.quantity),
+            unit_price=quantize_amount(item.unit_price),
+            total_price=totals.line_total(i)
         )
         db.add(db_item)
     
+    invoice_search.index_invoices(db, [db_invoice.id])
     db.commit()
     
     # Log workflow action
@@ -135,41 +193,82 @@ def create_invoice(
 def read_invoices(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_verified_user)
+    db: Session = Depends(get_tenant_read_db),
+    current_user: User = Depends(get_current_verified_user_for_read)
 ):
     invoices = db.query(Invoice).offset(skip).limit(limit).all()
     return invoices
 
+@router.get("/invoices/search", response_model=List[InvoiceSchema])
+def search_invoices(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset cannot be negative")
+    return invoice_search.search(db, q, limit, offset)
+
 @router.get("/invoices/{invoice_id}", response_model=InvoiceSchema)
 def read_invoice(
     invoice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_verified_user)
+    request: Request,
+    db: Session = Depends(get_tenant_read_db),
+    current_user: User = Depends(get_current_verified_user_for_read)
 ):
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
-    if invoice is None:
+    # Primary key lookup of the version columns only
+    version = db.query(Invoice.status, Invoice.version).filter(Invoice.id == invoice_id).first()
+    if version is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    return invoice
+    
+    terminal = WorkflowEngine.is_terminal(version.status)
+    etag = ResponseCache.make_etag("invoice", invoice_id, version.version)
+    headers = {"ETag": etag, "Cache-Control": invoice_cache.cache_control(terminal)}
+    if ResponseCache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    cache_key = (current_user.tenant_id, invoice_id)
+    body = invoice_cache.get(cache_key, etag)
+    if body is None:
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        body = InvoiceSchema.model_validate(invoice).model_dump_json()
+        invoice_cache.set(cache_key, etag, body, terminal)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.put("/invoices/{invoice_id}", response_model=InvoiceSchema)
 def update_invoice(
     invoice_id: int,
     invoice_update: InvoiceUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tenant_db),
     current_user: User = Depends(get_current_verified_user)
 ):
     invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
     if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
+    # Paid and cancelled invoices are final, which is what lets clients cache them for a long time
+    if WorkflowEngine.is_terminal(invoice.status):
+        raise HTTPException(status_code=409, detail=f"Invoice is {invoice.status} and can no longer be changed")
+    
     old_status = invoice.status
     
     for field, value in invoice_update.dict(exclude_unset=True).items():
         setattr(invoice, field, value)
     
-    db.commit()
+    try:
+        if invoice_update.description is not None:
+            db.flush()
+            invoice_search.index_invoices(db, [invoice.id])
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Invoice was modified concurrently, please retry")
     db.refresh(invoice)
+    invoice_cache.invalidate((invoice.tenant_id, invoice.id))
     
     # Log workflow action if status changed
     if invoice_update.status and old_status != invoice_update.status:
@@ -179,16 +278,34 @@ def update_invoice(
     
     return invoice
 
+@router.get("/invoices/{invoice_id}/history", response_model=WorkflowHistoryPage)
+def read_invoice_history(
+    invoice_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 500")
+    if db.query(Invoice.id).filter(Invoice.id == invoice_id).first() is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    try:
+        logs, next_cursor = WorkflowEngine.get_workflow_history_page(db, invoice_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": logs, "next_cursor": next_cursor}
+
 # File upload endpoints
 @router.post("/files/upload", response_model=FileUploadResponse)
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tenant_db),
     current_user: User = Depends(get_current_verified_user)
 ):
     # Validate file size
-    max_size = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB default
-    if file.size > max_size:
+    if file.size > file_storage.max_file_size:
         raise HTTPException(status_code=413, detail="File too large")
     
     # Generate unique filename
@@ -196,8 +313,7 @@ async def upload_file(
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     
     # Save file
-    upload_dir = os.getenv("UPLOAD_DIR", "./uploads")
-    file_path = os.path.join(upload_dir, unique_filename)
+    file_path = os.path.join(file_storage.ensure_upload_dir(), unique_filename)
     
     async with aiofiles.open(file_path, 'wb') as f:
         content = await file.read()
@@ -210,21 +326,181 @@ async def upload_file(
         file_path=file_path,
         file_size=file.size,
         content_type=file.content_type,
-        user_id=current_user.id
+        user_id=current_user.id,
+        processing_status="pending"
     )
     
     db.add(db_file)
     db.commit()
     db.refresh(db_file)
     
+    # Type sniffing, thumbnails and metadata run after the response is sent
+    background_tasks.add_task(upload_processor.process, db_file.id, current_user.tenant_id)
+    
     return db_file
 
 @router.get("/files", response_model=List[FileUploadResponse])
 def list_files(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_verified_user)
+    db: Session = Depends(get_tenant_read_db),
+    current_user: User = Depends(get_current_verified_user_for_read)
 ):
     files = db.query(FileStorage).filter(FileStorage.user_id == current_user.id).offset(skip).limit(limit).all()
     return files
+
+@router.get("/files/{file_id}", response_model=FileUploadResponse)
+def read_file(
+    file_id: int,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    db_file = db.query(FileStorage).filter(FileStorage.id == file_id, FileStorage.user_id == current_user.id).first()
+    if db_file is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return db_file
+
+# Bulk import endpoints
+IMPORTABLE_TYPES = ['text/csv', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']
+
+@router.post("/imports", response_model=ImportJobSchema, status_code=status.HTTP_202_ACCEPTED)
+def create_import(
+    import_request: ImportJobCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    db_file = db.query(FileStorage).filter(
+        FileStorage.id == import_request.file_id, FileStorage.user_id == current_user.id
+    ).first()
+    if db_file is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    if db_file.content_type not in IMPORTABLE_TYPES:
+        raise HTTPException(status_code=415, detail="Only CSV and XLSX files can be imported")
+    if db_file.processing_status in ("pending", "processing"):
+        raise HTTPException(status_code=409, detail="File is still being processed")
+    # Only files that processing verified, and whose sniffed type is importable, can be imported
+    if db_file.processing_status != "done" or not any(
+        types_compatible(importable, db_file.detected_type) for importable in IMPORTABLE_TYPES
+    ):
+        raise HTTPException(status_code=415, detail="File failed verification and cannot be imported")
+    
+    job = ImportJob(file_id=db_file.id, user_id=current_user.id, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    
+    background_tasks.add_task(invoice_importer.run, job.id, current_user.tenant_id, import_request.client_id)
+    
+    return job
+
+@router.get("/imports/{job_id}", response_model=ImportJobSchema)
+def read_import(
+    job_id: int,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.user_id == current_user.id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.get("/imports/{job_id}/errors")
+def download_import_errors(
+    job_id: int,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.user_id == current_user.id).first()
+    if job is None or not job.error_report_path or not os.path.exists(job.error_report_path):
+        raise HTTPException(status_code=404, detail="Error report not found")
+    return FileResponse(job.error_report_path, media_type="text/csv", filename=f"import-{job_id}-errors.csv")
+
+# Recurring billing endpoints
+@router.post("/subscriptions", response_model=SubscriptionSchema)
+def create_subscription(
+    subscription: SubscriptionCreate,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    if db.query(User.id).filter(User.id == subscription.customer_id).first() is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    db_subscription = Subscription(
+        **subscription.dict(exclude={"start_date", "items"}),
+        anchor_date=subscription.start_date,
+        next_run_date=subscription.start_date
+    )
+    db.add(db_subscription)
+    db.flush()
+    
+    for item in subscription.items:
+        db.add(SubscriptionItem(
+            subscription_id=db_subscription.id,
+            description=item.description,
+            quantity=quantize_quantity(item.quantity),
+            unit_price=quantize_amount(item.unit_price)
+        ))
+    
+    db.commit()
+    db.refresh(db_subscription)
+    
+    return db_subscription
+
+@router.get("/subscriptions", response_model=List[SubscriptionSchema])
+def read_subscriptions(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_tenant_read_db),
+    current_user: User = Depends(get_current_verified_user_for_read)
+):
+    return db.query(Subscription).order_by(Subscription.id).offset(skip).limit(limit).all()
+
+@router.post("/billing-runs", response_model=BillingRunSchema, status_code=status.HTTP_202_ACCEPTED)
+def create_billing_run(
+    billing_run: BillingRunCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    run = BillingRun(
+        period_end=billing_run.period_end or datetime.utcnow(),
+        user_id=current_user.id,
+        status="running"
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    
+    background_tasks.add_task(recurring_billing.run, run.id, current_user.tenant_id)
+    
+    return run
+
+@router.get("/billing-runs/{run_id}", response_model=BillingRunSchema)
+def read_billing_run(
+    run_id: int,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    run = db.query(BillingRun).filter(BillingRun.id == run_id).first()
+    if run is None:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    return run
+
+@router.post("/billing-runs/{run_id}/resume", response_model=BillingRunSchema, status_code=status.HTTP_202_ACCEPTED)
+def resume_billing_run(
+    run_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_tenant_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    run = db.query(BillingRun).filter(BillingRun.id == run_id).first()
+    if run is None:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    if run.status == "done":
+        raise HTTPException(status_code=400, detail="Billing run already completed")
+    
+    # Subscriptions already billed have moved past period_end, so only the rest are picked up
+    background_tasks.add_task(recurring_billing.run, run.id, current_user.tenant_id)
+    
+    return run
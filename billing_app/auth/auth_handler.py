@@ -1,20 +1,20 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-import os
-from dotenv import load_dotenv
 
+from billing_app.config import get_settings
 from billing_app.models.database import get_db, User
+from billing_app.models.replicas import replica_router, record_request_user
 from billing_app.models.schemas import TokenData
 
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+settings = get_settings()
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+INVITE_EXPIRE_HOURS = settings.invite_expire_hours
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -58,6 +58,21 @@ class AuthHandler:
                 headers={"WWW-Authenticate": "Bearer"},
             )
     
+    def create_invite_token(self, tenant_id: int) -> str:
+        """Signed token that lets a new registration join an existing tenant"""
+        expire = datetime.utcnow() + timedelta(hours=INVITE_EXPIRE_HOURS)
+        return jwt.encode({"purpose": "invite", "tenant": tenant_id, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+    def verify_invite_token(self, token: str) -> int:
+        """Tenant id carried by an invite token; access tokens and expired invites are rejected"""
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=400, detail="Invalid or expired invite")
+        if payload.get("purpose") != "invite" or not isinstance(payload.get("tenant"), int):
+            raise HTTPException(status_code=400, detail="Invalid or expired invite")
+        return payload["tenant"]
+
     def authenticate_user(self, db: Session, username: str, password: str):
         user = db.query(User).filter(User.username == username).first()
         if not user:
@@ -81,6 +96,27 @@ async def get_current_user(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    record_request_user(user.username)
+    return user
+
+def get_current_user_for_read(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Like get_current_user, but loads the user through the read replica router"""
+    token_data = auth_handler.verify_token(credentials.credentials)
+    db = replica_router.read_session(replica_router.stick_to_primary(
+        token_data.username, request.cookies.get(replica_router.STICKY_COOKIE)
+    ))
+    try:
+        user = db.query(User).filter(User.username == token_data.username).first()
+    finally:
+        db.close()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -92,3 +128,8 @@ async def get_current_verified_user(current_user: User = Depends(get_current_act
     if not current_user.is_verified:
         raise HTTPException(status_code=400, detail="User not verified")
     return current_user
+
+def get_current_verified_user_for_read(current_user: User = Depends(get_current_user_for_read)):
+    if not current_user.is_verified:
+        raise HTTPException(status_code=400, detail="User not verified")
+    return current_user
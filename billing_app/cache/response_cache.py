@@ -0,0 +1,80 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from billing_app.config import get_settings
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized response bodies keyed by ETag
+    """
+
+    def __init__(self, max_entries: int = None, ttl: int = None, terminal_ttl: int = None):
+        settings = get_settings()
+        self.max_entries = max_entries or settings.response_cache_size
+        self.ttl = ttl or settings.response_cache_ttl
+        self.terminal_ttl = terminal_ttl or settings.response_cache_terminal_ttl
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_etag(*parts) -> str:
+        """Build a weak ETag from the values that identify a row version"""
+        raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+        return f'W/"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """Check an If-None-Match header against an ETag"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: W/"x" matches "x"
+        opaque = etag[2:] if etag.startswith("W/") else etag
+        return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in tags)
+
+    def cache_control(self, terminal: bool = False) -> str:
+        """Cache-Control header for a response"""
+        if terminal:
+            return f"private, max-age={self.terminal_ttl}"
+        return "private, no-cache"
+
+    def get(self, key, etag: str) -> Optional[bytes]:
+        """Return the cached body for key if it is still current for etag"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_etag, body, expires_at = entry
+            if cached_etag != etag or expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, etag: str, body: bytes, terminal: bool = False):
+        """Store a serialized body, evicting the least recently used entry"""
+        expires_at = time.monotonic() + (self.terminal_ttl if terminal else self.ttl)
+        with self._lock:
+            self._entries[key] = (etag, body, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a cached body after a write"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global instance
+invoice_cache = ResponseCache()
@@ -0,0 +1,79 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _bool(value: str) -> bool:
+    return value.lower() == "true"
+
+
+class Settings:
+    """
+    Application settings, read once from the environment and .env
+    """
+
+    def __init__(self):
+        load_dotenv()
+
+        self.app_name = os.getenv("APP_NAME", "Billing Application")
+        self.version = os.getenv("VERSION", "1.0.0")
+        self.debug = _bool(os.getenv("DEBUG", "False"))
+
+        # Database
+        self.database_url = os.getenv("DATABASE_URL", "sqlite:///./billing.db")
+        self.auto_migrate = _bool(os.getenv("AUTO_MIGRATE", "False"))
+
+        # Read replicas: comma-separated URLs; reads stay on the primary for a while after a user writes
+        self.database_replica_urls = [
+            url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+        ]
+        self.replica_health_interval = int(os.getenv("REPLICA_HEALTH_INTERVAL", "10"))
+        self.read_your_writes_window = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+        # Shares each user's read-your-writes deadline between nodes; in memory when unset
+        self.read_your_writes_redis_url: Optional[str] = os.getenv("READ_YOUR_WRITES_REDIS_URL")
+
+        # Tenancy; a signup gets its own tenant unless it carries an invite
+        self.invite_expire_hours = int(os.getenv("INVITE_EXPIRE_HOURS", "72"))
+        self.tenant_cache_ttl = int(os.getenv("TENANT_CACHE_TTL", "60"))
+
+        # Authentication
+        self.secret_key = os.getenv("SECRET_KEY", "your-secret-key-here")
+        self.algorithm = os.getenv("ALGORITHM", "HS256")
+        self.access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+        # File storage
+        self.upload_dir = os.getenv("UPLOAD_DIR", "./uploads")
+        self.max_file_size = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
+        self.upload_processing_workers = int(os.getenv("UPLOAD_PROCESSING_WORKERS", "2"))
+
+        # Bulk import
+        self.import_chunk_size = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+        # Kept outside UPLOAD_DIR so reports are only reachable through the authenticated endpoint
+        self.import_report_dir = os.getenv("IMPORT_REPORT_DIR", "./import_reports")
+
+        # Recurring billing runs
+        self.billing_run_chunk_size = int(os.getenv("BILLING_RUN_CHUNK_SIZE", "500"))
+        self.billing_run_workers = int(os.getenv("BILLING_RUN_WORKERS", "4"))
+
+        # Response cache
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+        self.response_cache_ttl = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+        self.response_cache_terminal_ttl = int(os.getenv("RESPONSE_CACHE_TERMINAL_TTL", "86400"))
+
+        # Rate limiting
+        self.rate_limit_enabled = _bool(os.getenv("RATE_LIMIT_ENABLED", "True"))
+        self.rate_limit_redis_url: Optional[str] = os.getenv("RATE_LIMIT_REDIS_URL")
+        # Comma-separated proxy IPs or CIDRs whose X-Forwarded-For is trusted for the client IP
+        self.trusted_proxies = [
+            proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+        ]
+
+        # Startup time budget in milliseconds; exceeding it is logged
+        self.startup_budget_ms = int(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings()
@@ -0,0 +1,275 @@
+import os
+import csv
+import uuid
+import logging
+import itertools
+from itertools import accumulate
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from billing_app.config import get_settings
+from billing_app.models.database import User, Invoice, InvoiceItem, WorkflowLog, FileStorage, ImportJob
+from billing_app.models.schemas import InvoiceCreate
+from billing_app.websockets.ws_manager import ws_manager
+from billing_app.money.totals import TotalsCalculator, quantize_amount, quantize_quantity
+from billing_app.search.invoice_search import invoice_search
+from billing_app.tenancy.session import tenant_router
+
+logger = logging.getLogger(__name__)
+
+XLSX_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# One row per line item; consecutive rows with the same invoice_number form one invoice
+INVOICE_COLUMNS = ['invoice_number', 'customer_id', 'total_amount', 'tax_amount', 'due_date', 'description']
+ITEM_COLUMNS = {'item_description': 'description', 'quantity': 'quantity', 'unit_price': 'unit_price'}
+# Columns that stay text even when a spreadsheet cell holds a number or date
+TEXT_COLUMNS = ('invoice_number', 'description', 'item_description')
+
+invoice_batch_adapter = TypeAdapter(List[InvoiceCreate])
+
+
+def iter_csv_rows(file_path: str) -> Iterator[dict]:
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def _cell_text(value):
+    # openpyxl returns typed cells; a whole number typed as 1001 may come back as 1001.0
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def iter_xlsx_rows(file_path: str) -> Iterator[dict]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        for values in rows:
+            row = dict(zip(header, values))
+            for column in TEXT_COLUMNS:
+                if column in row:
+                    row[column] = _cell_text(row[column])
+            yield row
+    finally:
+        workbook.close()
+
+
+def iter_rows(file_path: str, content_type: Optional[str]) -> Iterator[dict]:
+    """Stream rows from a CSV or XLSX file as dicts keyed by header"""
+    if content_type == XLSX_TYPE or file_path.endswith('.xlsx'):
+        return iter_xlsx_rows(file_path)
+    return iter_csv_rows(file_path)
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def iter_invoices(rows: Iterator[dict]) -> Iterator[Tuple[int, int, dict]]:
+    """
+    Group consecutive item rows into invoice payloads
+    Yields (first line number, row count, payload)
+    """
+    current, first_line, count = None, 0, 0
+    # Line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        number = row.get('invoice_number')
+        if current is None or number != current['invoice_number']:
+            if current is not None:
+                yield first_line, count, current
+            current = {col: row.get(col) for col in INVOICE_COLUMNS if not _blank(row.get(col))}
+            current['invoice_number'] = number
+            current['items'] = []
+            first_line, count = line, 0
+        current['items'].append({dest: row.get(src) for src, dest in ITEM_COLUMNS.items()})
+        count += 1
+    if current is not None:
+        yield first_line, count, current
+
+
+def validate_batch(payloads: List[dict]) -> Tuple[List[Tuple[int, InvoiceCreate]], dict]:
+    """
+    Validate a batch of invoice payloads in a single pass
+    Returns the valid (index, model) pairs and a map of index -> error message
+    """
+    errors = {}
+    try:
+        models = invoice_batch_adapter.validate_python(payloads)
+        return list(enumerate(models)), errors
+    except ValidationError as e:
+        for err in e.errors():
+            index = err['loc'][0]
+            field = '.'.join(str(part) for part in err['loc'][1:])
+            errors.setdefault(index, f"{field}: {err['msg']}")
+    indexes = [i for i in range(len(payloads)) if i not in errors]
+    models = invoice_batch_adapter.validate_python([payloads[i] for i in indexes])
+    return list(zip(indexes, models)), errors
+
+
+class InvoiceImporter:
+    """
+    Imports invoices from an uploaded CSV/XLSX file in chunked transactions
+    """
+
+    def __init__(self, chunk_size: int = None, error_dir: str = None):
+        self.chunk_size = chunk_size or get_settings().import_chunk_size
+        self.error_dir = error_dir or get_settings().import_report_dir
+
+    def _import_chunk(self, db, chunk: List[Tuple[int, int, dict]], user_id: int, error_writer) -> Tuple[int, int]:
+        """Validate and insert one chunk; returns (imported, errors)"""
+        valid, errors = validate_batch([payload for _, _, payload in chunk])
+
+        models = [model for _, model in valid]
+        totals = TotalsCalculator.for_invoices(models)
+        mismatches = TotalsCalculator.reconcile(models, totals)
+        oversized = TotalsCalculator.check_limits(totals)
+        # Offset of each invoice's first line in the totals arrays
+        offsets = [0] + list(accumulate(len(model.items) for model in models))
+
+        # Drop invoice numbers already present in the database or earlier in the chunk
+        numbers = [model.invoice_number for model in models]
+        existing = {n for (n,) in db.query(Invoice.invoice_number).filter(Invoice.invoice_number.in_(numbers))}
+        customer_ids = {model.customer_id for model in models}
+        customers = {i for (i,) in db.query(User.id).filter(User.id.in_(customer_ids))}
+        accepted, seen = [], set()
+        for position, (index, model) in enumerate(valid):
+            if mismatches[position]:
+                errors[index] = f"total_amount: {mismatches[position]}"
+            elif oversized[position]:
+                errors[index] = f"total_amount: {oversized[position]}"
+            elif model.invoice_number in existing or model.invoice_number in seen:
+                errors[index] = "invoice_number: already exists"
+            elif model.customer_id not in customers:
+                errors[index] = "customer_id: customer not found"
+            else:
+                seen.add(model.invoice_number)
+                accepted.append(position)
+
+        for index in sorted(errors):
+            line, _, payload = chunk[index]
+            error_writer.writerow([line, payload.get('invoice_number'), errors[index]])
+
+        if accepted:
+            invoice_rows = [
+                {
+                    'tenant_id': db.info['tenant_id'],
+                    'invoice_number': models[position].invoice_number,
+                    'customer_id': models[position].customer_id,
+                    'total_amount': totals.subtotal(position),
+                    'tax_amount': totals.tax(position),
+                    'due_date': models[position].due_date,
+                    'description': models[position].description,
+                    'status': 'draft',
+                }
+                for position in accepted
+            ]
+            ids = dict(db.execute(
+                insert(Invoice).returning(Invoice.invoice_number, Invoice.id), invoice_rows
+            ).all())
+            db.execute(insert(InvoiceItem), [
+                {
+                    'invoice_id': ids[models[position].invoice_number],
+                    'description': item.description,
+                    'quantity': quantize_quantity(item.quantity),
+                    'unit_price': quantize_amount(item.unit_price),
+                    'total_price': totals.line_total(offsets[position] + line),
+                }
+                for position in accepted for line, item in enumerate(models[position].items)
+            ])
+            db.execute(insert(WorkflowLog), [
+                {
+                    'invoice_id': ids[models[position].invoice_number],
+                    'action': 'created',
+                    'from_status': None,
+                    'to_status': 'draft',
+                    'user_id': user_id,
+                    'notes': 'Invoice imported',
+                }
+                for position in accepted
+            ])
+            invoice_search.index_invoices(db, list(ids.values()))
+        return len(accepted), len(errors)
+
+    def _run_chunk(self, job_id: int, tenant_id: int, invoices: Iterator, user_id: int,
+                   error_writer) -> Optional[ImportJob]:
+        """Import the next chunk in its own transaction; returns None when the file is exhausted"""
+        chunk = list(itertools.islice(invoices, self.chunk_size))
+        if not chunk:
+            return None
+        db = tenant_router.open_session(tenant_id)
+        try:
+            imported, failed = self._import_chunk(db, chunk, user_id, error_writer)
+            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+            job.processed_rows += sum(count for _, count, _ in chunk)
+            job.imported_count += imported
+            job.error_count += failed
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+            return job
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _set_job(self, job_id: int, tenant_id: int, **fields) -> ImportJob:
+        db = tenant_router.open_session(tenant_id)
+        try:
+            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+            for field, value in fields.items():
+                setattr(job, field, value)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    async def _notify(self, job: ImportJob, client_id: Optional[str]):
+        await ws_manager.send_import_progress(
+            job.id, job.status, job.processed_rows, job.imported_count, job.error_count, client_id
+        )
+
+    async def run(self, job_id: int, tenant_id: int, client_id: str = None):
+        """Run an import job, streaming the file and reporting progress after every chunk"""
+        db = tenant_router.open_session(tenant_id)
+        try:
+            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+            db_file = db.query(FileStorage).filter(FileStorage.id == job.file_id).first()
+            file_path, content_type, user_id = db_file.file_path, db_file.content_type, job.user_id
+        finally:
+            db.close()
+
+        os.makedirs(self.error_dir, exist_ok=True)
+        error_report_path = os.path.join(self.error_dir, f"{tenant_id}-{job_id}-{uuid.uuid4().hex}.csv")
+        job = self._set_job(job_id, tenant_id, status="running", error_report_path=error_report_path)
+        await self._notify(job, client_id)
+
+        try:
+            with open(error_report_path, 'w', newline='') as report:
+                error_writer = csv.writer(report)
+                error_writer.writerow(['line', 'invoice_number', 'error'])
+                invoices = iter_invoices(iter_rows(file_path, content_type))
+                while True:
+                    progress = await run_in_threadpool(self._run_chunk, job_id, tenant_id, invoices, user_id, error_writer)
+                    if progress is None:
+                        break
+                    await self._notify(progress, client_id)
+            job = self._set_job(job_id, tenant_id, status="done", finished_at=datetime.utcnow())
+        except Exception:
+            logger.exception("Import job %s failed", job_id)
+            job = self._set_job(job_id, tenant_id, status="failed", finished_at=datetime.utcnow())
+        await self._notify(job, client_id)
+
+# Global instance
+invoice_importer = InvoiceImporter()
@@ -1,13 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Numeric, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, declared_attr
 from sqlalchemy.sql import func
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from billing_app.config import get_settings
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./billing.db")
+DATABASE_URL = get_settings().database_url
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -20,7 +18,36 @@ def get_db():
     finally:
         db.close()
 
-class User(Base):
+def run_migrations(revision: str = "head"):
+    """Apply Alembic migrations; used at startup when AUTO_MIGRATE is enabled"""
+    import os
+    from alembic import command
+    from alembic.config import Config
+    
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    command.upgrade(Config(os.path.join(root, "alembic.ini")), revision)
+
+class Tenant(Base):
+    __tablename__ = "tenants"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    slug = Column(String, unique=True, index=True, nullable=False)
+    database_url = Column(String)  # Set to move the tenant's data to its own database
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TenantScoped:
+    """
+    Mixin for tables whose rows belong to a tenant
+    Queries on these tables are filtered by the session's tenant (see billing_app.tenancy)
+    """
+    
+    @declared_attr
+    def tenant_id(cls):
+        return Column(Integer, ForeignKey("tenants.id"), nullable=False)
+
+class User(TenantScoped, Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -33,29 +60,45 @@ class User(Base):
     verification_token = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Bumped on every write; the /auth/me ETag is derived from it
+    version = Column(Integer, nullable=False, default=1)
     
     # Relationships
     invoices = relationship("Invoice", back_populates="customer")
     files = relationship("FileStorage", back_populates="user")
+    
+    __table_args__ = (
+        Index("ix_users_tenant_id_id", "tenant_id", "id"),
+    )
+    __mapper_args__ = {"version_id_col": version}
 
-class Invoice(Base):
+class Invoice(TenantScoped, Base):
     __tablename__ = "invoices"
     
     id = Column(Integer, primary_key=True, index=True)
-    invoice_number = Column(String, unique=True, index=True, nullable=False)
+    invoice_number = Column(String, nullable=False)  # Unique per tenant
     customer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    total_amount = Column(Float, nullable=False)
-    tax_amount = Column(Float, default=0.0)
+    total_amount = Column(Numeric(12, 2), nullable=False)
+    tax_amount = Column(Numeric(12, 2), default=0)
     status = Column(String, default="draft")  # draft, sent, paid, overdue, cancelled
     due_date = Column(DateTime)
     description = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Bumped on every write; the invoice ETag is derived from it
+    version = Column(Integer, nullable=False, default=1)
     
     # Relationships
     customer = relationship("User", back_populates="invoices")
     items = relationship("InvoiceItem", back_populates="invoice")
     workflow_logs = relationship("WorkflowLog", back_populates="invoice")
+    
+    __table_args__ = (
+        Index("uq_invoices_tenant_id_invoice_number", "tenant_id", "invoice_number", unique=True),
+        Index("ix_invoices_tenant_id_id", "tenant_id", "id"),
+        Index("ix_invoices_tenant_id_customer_id", "tenant_id", "customer_id"),
+    )
+    __mapper_args__ = {"version_id_col": version}
 
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
@@ -63,9 +106,9 @@ class InvoiceItem(Base):
     id = Column(Integer, primary_key=True, index=True)
     invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False)
     description = Column(String, nullable=False)
-    quantity = Column(Float, nullable=False)
-    unit_price = Column(Float, nullable=False)
-    total_price = Column(Float, nullable=False)
+    quantity = Column(Numeric(12, 3), nullable=False)
+    unit_price = Column(Numeric(12, 2), nullable=False)
+    total_price = Column(Numeric(12, 2), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -85,8 +128,34 @@ class WorkflowLog(Base):
     
     # Relationships
     invoice = relationship("Invoice", back_populates="workflow_logs")
+    
+    __table_args__ = (
+        Index("ix_workflow_logs_invoice_id_created_at", "invoice_id", "created_at"),
+        Index("ix_workflow_logs_invoice_id_id", "invoice_id", "id"),
+        Index("ix_workflow_logs_created_at", "created_at"),
+    )
 
-class FileStorage(Base):
+class WorkflowLogArchive(Base):
+    """Workflow logs rolled over from workflow_logs once they pass the retention window"""
+    __tablename__ = "workflow_logs_archive"
+    
+    # Keeps the id of the original workflow_logs row
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    invoice_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    from_status = Column(String)
+    to_status = Column(String)
+    user_id = Column(Integer)
+    notes = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_workflow_logs_archive_invoice_id_created_at", "invoice_id", "created_at"),
+        Index("ix_workflow_logs_archive_invoice_id_id", "invoice_id", "id"),
+        Index("ix_workflow_logs_archive_created_at", "created_at"),
+    )
+
+class FileStorage(TenantScoped, Base):
     __tablename__ = "file_storage"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -96,7 +165,86 @@ class FileStorage(Base):
     file_size = Column(Integer, nullable=False)
     content_type = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    processing_status = Column(String, default="pending")  # pending, processing, done, rejected, failed
+    detected_type = Column(String)
+    thumbnail_path = Column(String)
+    file_metadata = Column(Text)  # JSON
+    processed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="files")
+    
+    __table_args__ = (
+        Index("ix_file_storage_tenant_id_user_id", "tenant_id", "user_id"),
+    )
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("file_storage.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    processed_rows = Column(Integer, default=0)
+    imported_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    error_report_path = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+class Subscription(TenantScoped, Base):
+    __tablename__ = "subscriptions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    customer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String, nullable=False)
+    interval_unit = Column(String, nullable=False, default="month")  # day, week, month, year
+    interval_count = Column(Integer, nullable=False, default=1)
+    # Cycle n falls on anchor_date + n intervals; next_run_date is cycle billed_cycles
+    anchor_date = Column(DateTime, nullable=False)
+    billed_cycles = Column(Integer, nullable=False, default=0)
+    next_run_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime)
+    tax_rate_bp = Column(Integer, default=0)  # Basis points, 1000 = 10%
+    due_days = Column(Integer, default=30)
+    description = Column(Text)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relationships
+    items = relationship("SubscriptionItem", back_populates="subscription")
+    
+    __table_args__ = (
+        Index("ix_subscriptions_tenant_id_next_run_date", "tenant_id", "next_run_date"),
+    )
+
+class SubscriptionItem(Base):
+    __tablename__ = "subscription_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False, index=True)
+    description = Column(String, nullable=False)
+    quantity = Column(Numeric(12, 3), nullable=False)
+    unit_price = Column(Numeric(12, 2), nullable=False)
+    
+    # Relationships
+    subscription = relationship("Subscription", back_populates="items")
+
+class BillingRun(TenantScoped, Base):
+    __tablename__ = "billing_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    period_end = Column(DateTime, nullable=False)
+    status = Column(String, default="running")  # running, done, failed
+    user_id = Column(Integer, ForeignKey("users.id"))
+    subscriptions_processed = Column(Integer, default=0)
+    invoices_generated = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0.0)
+    invoices_per_second = Column(Float, default=0.0)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    checkpoint_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
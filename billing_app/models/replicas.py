@@ -0,0 +1,289 @@
+import hmac
+import math
+import time
+import hashlib
+import logging
+import itertools
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from billing_app.config import get_settings
+from billing_app.models.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Set per request by ReadYourWritesMiddleware; session events flag it when the request commits a write,
+# and the authenticated user's name is recorded in it so the write can be tied to them
+_request_writes: ContextVar[Optional[dict]] = ContextVar("request_writes", default=None)
+
+
+class Replica:
+    """
+    A read replica engine and its last health check
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(
+            url, pool_pre_ping=True,
+            connect_args={"check_same_thread": False} if "sqlite" in url else {}
+        )
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = True
+        self.checked_at = 0.0
+
+    def check(self) -> bool:
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            self.healthy = True
+        except Exception:
+            logger.warning("Replica %r failed health check", self.engine.url, exc_info=True)
+            self.healthy = False
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+
+class MemoryWriteStore:
+    """
+    Per-user read-your-writes deadlines held in process memory, for a single node
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._deadlines: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, subject: str, window: float):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._deadlines) >= self.max_keys:
+                self._deadlines = {k: v for k, v in self._deadlines.items() if v > now}
+            if len(self._deadlines) < self.max_keys:
+                self._deadlines[subject] = now + window
+
+    def recent(self, subject: str) -> bool:
+        deadline = self._deadlines.get(subject)
+        return deadline is not None and deadline > time.monotonic()
+
+
+class RedisWriteStore:
+    """
+    Per-user read-your-writes deadlines shared between nodes through Redis
+    """
+
+    def __init__(self, url: str, prefix: str = "read_your_writes:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    def mark(self, subject: str, window: float):
+        self._client.set(self.prefix + subject, 1, px=max(1, int(window * 1000)))
+
+    def recent(self, subject: str) -> bool:
+        return bool(self._client.exists(self.prefix + subject))
+
+
+def get_write_store():
+    """Use Redis when READ_YOUR_WRITES_REDIS_URL is set, otherwise the in-memory stand-in"""
+    url = get_settings().read_your_writes_redis_url
+    if url:
+        return RedisWriteStore(url)
+    return MemoryWriteStore()
+
+
+class ReplicaRouter:
+    """
+    Sends read-only sessions to replicas round-robin, falling back to the primary
+
+    A user who wrote recently keeps reading from the primary for read_your_writes_window seconds.
+    The deadline is kept per authenticated user in the write store, so it holds for bearer clients
+    on any worker or node; a signed cookie carries it too, for clients that keep cookies.
+    Replica health is checked on a background thread, never on the request path.
+    """
+
+    STICKY_COOKIE = "read_your_writes"
+
+    def __init__(self, urls: List[str] = None, health_interval: int = None, sticky_window: float = None,
+                 secret_key: str = None, write_store=None):
+        settings = get_settings()
+        self.urls = urls if urls is not None else settings.database_replica_urls
+        self.health_interval = health_interval or settings.replica_health_interval
+        self.sticky_window = sticky_window if sticky_window is not None else settings.read_your_writes_window
+        self._secret = (secret_key or settings.secret_key).encode()
+        self._write_store = write_store
+        self._replicas: Optional[List[Replica]] = None
+        self._cycle = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def replicas(self) -> List[Replica]:
+        # Engines and the health monitor are created on first use
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    self._replicas = [Replica(url) for url in self.urls]
+                    self._cycle = itertools.cycle(range(len(self._replicas)))
+                    if self._replicas:
+                        self._monitor = threading.Thread(
+                            target=self._monitor_health, name="replica-health", daemon=True
+                        )
+                        self._monitor.start()
+        return self._replicas
+
+    def _monitor_health(self):
+        while not self._stopped.is_set():
+            for replica in self._replicas:
+                replica.check()
+            self._stopped.wait(self.health_interval)
+
+    def _sign(self, value: str) -> str:
+        return hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def sticky_cookie(self) -> str:
+        """Set-Cookie value that pins the client to the primary for the sticky window"""
+        until = f"{time.time() + self.sticky_window:.3f}"
+        return (
+            f"{self.STICKY_COOKIE}={until}.{self._sign(until)}; Max-Age={math.ceil(self.sticky_window)}; "
+            f"Path=/; HttpOnly; SameSite=Lax"
+        )
+
+    def is_sticky(self, token: Optional[str]) -> bool:
+        """Check a sticky cookie value; forged or expired values are ignored"""
+        if not token:
+            return False
+        until, _, signature = token.rpartition(".")
+        if not until or not hmac.compare_digest(signature, self._sign(until)):
+            return False
+        try:
+            return float(until) > time.time()
+        except ValueError:
+            return False
+
+    @property
+    def write_store(self):
+        # Created on first use so importing the module opens no connections
+        if self._write_store is None:
+            self._write_store = get_write_store()
+        return self._write_store
+
+    def mark_write(self, subject: str):
+        """Keep the user's reads on the primary for the sticky window"""
+        try:
+            self.write_store.mark(subject, self.sticky_window)
+        except Exception:
+            logger.warning("Could not record a write by %r; reads may lag behind it", subject, exc_info=True)
+
+    def wrote_recently(self, subject: Optional[str]) -> bool:
+        if not subject:
+            return False
+        try:
+            return self.write_store.recent(subject)
+        except Exception:
+            # Without the store, read from the primary rather than risk a stale read
+            logger.warning("Could not look up recent writes by %r", subject, exc_info=True)
+            return True
+
+    def stick_to_primary(self, subject: Optional[str], cookie: Optional[str] = None) -> bool:
+        """Whether a read should go to the primary: the user wrote recently, or the client's cookie says so"""
+        if not self.urls:
+            return False
+        return self.is_sticky(cookie) or self.wrote_recently(subject)
+
+    def next_replica(self) -> Optional[Replica]:
+        """Next healthy replica in round-robin order, or None if there is none"""
+        replicas = self.replicas
+        for _ in range(len(replicas)):
+            with self._lock:
+                replica = replicas[next(self._cycle)]
+            if replica.healthy:
+                return replica
+        return None
+
+    def read_session(self, sticky: bool = False) -> Session:
+        """Open a session for reads; sticky clients read from the primary"""
+        replica = None if sticky else self.next_replica()
+        if replica is None:
+            return SessionLocal()
+        db = replica.sessionmaker()
+        db.info["read_only"] = True
+        return db
+
+    def status(self) -> list:
+        return [{"url": repr(r.engine.url), "healthy": r.healthy} for r in self.replicas]
+
+    def shutdown(self):
+        self._stopped.set()
+
+# Global instance
+replica_router = ReplicaRouter()
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware that tracks writes per request and hands the sticky cookie to clients that wrote
+    """
+
+    def __init__(self, app, router: ReplicaRouter = None):
+        self.app = app
+        self.router = router or replica_router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        writes = {}
+        token = _request_writes.set(writes)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes.get("wrote"):
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", self.router.sticky_cookie().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(token)
+
+
+def record_request_user(subject: str):
+    """Tie writes committed by the current request to the authenticated user"""
+    writes = _request_writes.get()
+    if writes is not None:
+        writes["subject"] = subject
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_replica_writes(session, flush_context, instances):
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("Cannot write through a read replica session")
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_write(execute_state):
+    if execute_state.is_insert or execute_state.is_update or execute_state.is_delete:
+        execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_request_write(session):
+    writes = _request_writes.get()
+    if session.info.pop("wrote", False) and writes is not None:
+        writes["wrote"] = True
+        if writes.get("subject"):
+            replica_router.mark_write(writes["subject"])
@@ -1,6 +1,13 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, PlainSerializer, validator
+from typing import Optional, List, Annotated
 from datetime import datetime
+from decimal import Decimal
+
+from billing_app.money.totals import MAX_AMOUNT, MAX_QUANTITY, quantize_amount, quantize_quantity
+
+# Exact decimal internally, plain JSON numbers on the wire
+Money = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
+Quantity = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
 
 class UserBase(BaseModel):
     username: str
@@ -9,6 +16,9 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str
+    # Name for the new tenant; ignored when joining an existing one through invite_token
+    organization: Optional[str] = None
+    invite_token: Optional[str] = None
     
     @validator('password')
     def validate_password(cls, v):
@@ -45,21 +55,32 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+class TenantInvite(BaseModel):
+    invite_token: str
+    expires_in: int
+
 class InvoiceItemBase(BaseModel):
     description: str
-    quantity: float
-    unit_price: float
+    quantity: Quantity
+    unit_price: Money
     
     @validator('quantity')
     def validate_quantity(cls, v):
+        # Validate the value that will be stored, not the one submitted
+        v = quantize_quantity(v)
         if v <= 0:
             raise ValueError('Quantity must be greater than 0')
+        if v > MAX_QUANTITY:
+            raise ValueError(f'Quantity cannot exceed {MAX_QUANTITY}')
         return v
     
     @validator('unit_price')
     def validate_unit_price(cls, v):
+        v = quantize_amount(v)
         if v < 0:
             raise ValueError('Unit price cannot be negative')
+        if v > MAX_AMOUNT:
+            raise ValueError(f'Unit price cannot exceed {MAX_AMOUNT}')
         return v
 
 class InvoiceItemCreate(InvoiceItemBase):
@@ -67,7 +88,7 @@ class InvoiceItemCreate(InvoiceItemBase):
 
 class InvoiceItem(InvoiceItemBase):
     id: int
-    total_price: float
+    total_price: Money
     created_at: datetime
     
     class Config:
@@ -75,19 +96,31 @@ class InvoiceItem(InvoiceItemBase):
 
 class InvoiceBase(BaseModel):
     invoice_number: str
-    total_amount: float
-    tax_amount: Optional[float] = 0.0
+    total_amount: Money
+    tax_amount: Optional[Money] = Decimal("0")
     due_date: Optional[datetime] = None
     description: Optional[str] = None
 
 class InvoiceCreate(InvoiceBase):
+    # Optional; when given it must match the total of the line items
+    total_amount: Optional[Money] = None
     customer_id: int
     items: List[InvoiceItemCreate]
     
     @validator('total_amount')
     def validate_total_amount(cls, v):
-        if v < 0:
+        if v is not None and v < 0:
             raise ValueError('Total amount cannot be negative')
+        if v is not None and v > MAX_AMOUNT:
+            raise ValueError(f'Total amount cannot exceed {MAX_AMOUNT}')
+        return v
+    
+    @validator('tax_amount')
+    def validate_tax_amount(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('Tax amount cannot be negative')
+        if v is not None and v > MAX_AMOUNT:
+            raise ValueError(f'Tax amount cannot exceed {MAX_AMOUNT}')
         return v
 
 class InvoiceUpdate(BaseModel):
@@ -131,13 +164,109 @@ class WorkflowLog(WorkflowLogBase):
     class Config:
         from_attributes = True
 
+class WorkflowHistoryPage(BaseModel):
+    items: List[WorkflowLog]
+    next_cursor: Optional[str] = None
+
 class FileUploadResponse(BaseModel):
     id: int
     filename: str
     original_filename: str
     file_size: int
     content_type: str
+    processing_status: Optional[str] = None
+    detected_type: Optional[str] = None
+    thumbnail_path: Optional[str] = None
+    file_metadata: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ImportJobCreate(BaseModel):
+    file_id: int
+    client_id: Optional[str] = None
+
+class ImportJob(BaseModel):
+    id: int
+    file_id: int
+    status: str
+    processed_rows: int
+    imported_count: int
+    error_count: int
     created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class SubscriptionItemCreate(InvoiceItemBase):
+    pass
+
+class SubscriptionItem(SubscriptionItemCreate):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
+class SubscriptionBase(BaseModel):
+    customer_id: int
+    name: str
+    interval_unit: str = "month"
+    interval_count: int = 1
+    end_date: Optional[datetime] = None
+    tax_rate_bp: int = 0
+    due_days: int = 30
+    description: Optional[str] = None
+    
+    @validator('interval_unit')
+    def validate_interval_unit(cls, v):
+        if v not in ['day', 'week', 'month', 'year']:
+            raise ValueError('Invalid interval unit')
+        return v
+    
+    @validator('interval_count')
+    def validate_interval_count(cls, v):
+        if v < 1:
+            raise ValueError('Interval count must be at least 1')
+        return v
+    
+    @validator('tax_rate_bp')
+    def validate_tax_rate(cls, v):
+        if v < 0:
+            raise ValueError('Tax rate cannot be negative')
+        return v
+
+class SubscriptionCreate(SubscriptionBase):
+    start_date: datetime
+    items: List[SubscriptionItemCreate]
+
+class Subscription(SubscriptionBase):
+    id: int
+    next_run_date: datetime
+    is_active: bool
+    created_at: datetime
+    items: List[SubscriptionItem] = []
+    
+    class Config:
+        from_attributes = True
+
+class BillingRunCreate(BaseModel):
+    period_end: Optional[datetime] = None
+
+class BillingRun(BaseModel):
+    id: int
+    period_end: datetime
+    status: str
+    subscriptions_processed: int
+    invoices_generated: int
+    failed_count: int
+    elapsed_seconds: float
+    invoices_per_second: float
+    error: Optional[str] = None
+    started_at: datetime
+    checkpoint_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
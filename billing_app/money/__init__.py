@@ -0,0 +1 @@
+# Money package
@@ -0,0 +1,171 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Amounts are held as integer cents, quantities as integer thousandths
+MINOR_UNIT_EXPONENT = 2
+QUANTITY_EXPONENT = 3
+MINOR_UNITS = 10 ** MINOR_UNIT_EXPONENT
+QUANTITY_SCALE = 10 ** QUANTITY_EXPONENT
+
+CENT = Decimal(1).scaleb(-MINOR_UNIT_EXPONENT)
+QUANTITY_STEP = Decimal(1).scaleb(-QUANTITY_EXPONENT)
+
+# Largest values the Numeric(12, 2) and Numeric(12, 3) columns can hold
+NUMERIC_PRECISION = 12
+MAX_AMOUNT = Decimal(10 ** (NUMERIC_PRECISION - MINOR_UNIT_EXPONENT)) - CENT
+MAX_QUANTITY = Decimal(10 ** (NUMERIC_PRECISION - QUANTITY_EXPONENT)) - QUANTITY_STEP
+MAX_AMOUNT_MINOR = int(MAX_AMOUNT.scaleb(MINOR_UNIT_EXPONENT))
+
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+
+def to_minor(amount) -> int:
+    """Convert an amount to integer minor units, rounding half up"""
+    return int(Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP).scaleb(MINOR_UNIT_EXPONENT))
+
+
+def from_minor(minor: int) -> Decimal:
+    """Convert integer minor units back to a Decimal amount"""
+    return Decimal(int(minor)).scaleb(-MINOR_UNIT_EXPONENT)
+
+
+def to_scaled_quantity(quantity) -> int:
+    return int(Decimal(str(quantity)).quantize(QUANTITY_STEP, rounding=ROUND_HALF_UP).scaleb(QUANTITY_EXPONENT))
+
+
+def from_scaled_quantity(quantity: int) -> Decimal:
+    return Decimal(int(quantity)).scaleb(-QUANTITY_EXPONENT)
+
+
+def quantize_amount(amount) -> Decimal:
+    return from_minor(to_minor(amount))
+
+
+def quantize_quantity(quantity) -> Decimal:
+    return from_scaled_quantity(to_scaled_quantity(quantity))
+
+
+def _divide_half_up(numerator: np.ndarray, denominator: int) -> np.ndarray:
+    # Inputs are non-negative, so floor division after adding half rounds half up
+    return (numerator + denominator // 2) // denominator
+
+
+def _peak(values: np.ndarray) -> int:
+    return int(np.abs(values).max()) if len(values) else 0
+
+
+def _working_dtype(quantities: np.ndarray, unit_prices: np.ndarray, tax_amounts: Optional[np.ndarray],
+                   tax_rates_bp: Optional[np.ndarray]):
+    """
+    int64 when the largest possible intermediate fits, otherwise Python ints in object arrays
+    Bounds are taken from the inputs, so ordinary invoices stay on the fast path.
+    """
+    line_peak = _peak(quantities) * _peak(unit_prices)
+    subtotal_peak = (line_peak // QUANTITY_SCALE + 1) * len(quantities)
+    if tax_amounts is not None:
+        tax_peak = _peak(tax_amounts)
+    elif tax_rates_bp is not None:
+        tax_peak = subtotal_peak * _peak(tax_rates_bp)
+    else:
+        tax_peak = 0
+    if max(line_peak + QUANTITY_SCALE, subtotal_peak + tax_peak) <= INT64_MAX:
+        return np.int64
+    return object
+
+
+class InvoiceTotals:
+    """
+    Totals for a batch of invoices, as arrays of minor units
+    """
+
+    def __init__(self, line_totals: np.ndarray, subtotals: np.ndarray, taxes: np.ndarray):
+        self.line_totals = line_totals
+        self.subtotals = subtotals
+        self.taxes = taxes
+        self.totals = subtotals + taxes
+
+    def line_total(self, index: int) -> Decimal:
+        return from_minor(self.line_totals[index])
+
+    def subtotal(self, invoice: int) -> Decimal:
+        return from_minor(self.subtotals[invoice])
+
+    def tax(self, invoice: int) -> Decimal:
+        return from_minor(self.taxes[invoice])
+
+
+class TotalsCalculator:
+    """
+    Vectorized invoice totals in integer minor units
+    """
+
+    @staticmethod
+    def calculate(quantities: np.ndarray, unit_prices: np.ndarray, invoice_index: np.ndarray,
+                  invoice_count: int, tax_amounts: Optional[np.ndarray] = None,
+                  tax_rates_bp: Optional[np.ndarray] = None) -> InvoiceTotals:
+        """
+        Compute line totals, per-invoice subtotals and tax for many invoices at once
+        quantities are scaled by QUANTITY_SCALE, prices and tax amounts are minor units,
+        invoice_index maps each line to its invoice and tax rates are in basis points.
+        Tax amounts take precedence over rates; without either tax is zero.
+        Batches whose products could pass int64 are computed with Python ints instead of wrapping.
+        """
+        dtype = _working_dtype(quantities, unit_prices, tax_amounts, tax_rates_bp)
+        line_totals = _divide_half_up(quantities.astype(dtype) * unit_prices.astype(dtype), QUANTITY_SCALE)
+        subtotals = np.zeros(invoice_count, dtype=dtype)
+        np.add.at(subtotals, invoice_index, line_totals)
+
+        if tax_amounts is not None:
+            taxes = tax_amounts.astype(dtype)
+        elif tax_rates_bp is not None:
+            taxes = _divide_half_up(subtotals * tax_rates_bp.astype(dtype), 10000)
+        else:
+            taxes = np.zeros(invoice_count, dtype=dtype)
+        return InvoiceTotals(line_totals, subtotals, taxes)
+
+    @classmethod
+    def for_invoices(cls, invoices: Sequence) -> InvoiceTotals:
+        """Compute totals for InvoiceCreate-like objects with items"""
+        # Object arrays so oversized values reach calculate() intact; it narrows to int64 when safe
+        quantities = np.array(
+            [to_scaled_quantity(item.quantity) for invoice in invoices for item in invoice.items], dtype=object
+        )
+        unit_prices = np.array(
+            [to_minor(item.unit_price) for invoice in invoices for item in invoice.items], dtype=object
+        )
+        invoice_index = np.repeat(
+            np.arange(len(invoices), dtype=np.int64),
+            [len(invoice.items) for invoice in invoices]
+        )
+        tax_amounts = np.array([to_minor(invoice.tax_amount or 0) for invoice in invoices], dtype=object)
+        return cls.calculate(quantities, unit_prices, invoice_index, len(invoices), tax_amounts=tax_amounts)
+
+    @staticmethod
+    def reconcile(invoices: Sequence, totals: InvoiceTotals) -> List[Optional[str]]:
+        """
+        Compare submitted total_amount values against the computed subtotals
+        Returns an error message per invoice, or None where the totals agree or none was submitted
+        """
+        errors = []
+        for i, invoice in enumerate(invoices):
+            if invoice.total_amount is not None and to_minor(invoice.total_amount) != totals.subtotals[i]:
+                errors.append(
+                    f"total_amount {invoice.total_amount} does not match line items total {totals.subtotal(i)}"
+                )
+            else:
+                errors.append(None)
+        return errors
+
+    @staticmethod
+    def check_limits(totals: InvoiceTotals) -> List[Optional[str]]:
+        """
+        Check each invoice's subtotal plus tax against MAX_AMOUNT before it is stored
+        Returns an error message per invoice, or None where the invoice fits
+        """
+        return [
+            f"invoice total {from_minor(total)} exceeds the maximum amount {MAX_AMOUNT}"
+            if total > MAX_AMOUNT_MINOR else None
+            for total in totals.totals
+        ]
@@ -0,0 +1,243 @@
+import time
+import json
+import math
+import ipaddress
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from billing_app.config import get_settings
+from billing_app.auth.auth_handler import SECRET_KEY, ALGORITHM
+
+
+class RateLimitRule:
+    """
+    Token bucket settings for a group of routes
+    """
+
+    def __init__(self, group: str, capacity: int, refill_per_second: float, path_prefixes: List[str] = None):
+        self.group = group
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.path_prefixes = path_prefixes or []
+
+    def matches(self, path: str) -> bool:
+        return any(path.startswith(prefix) for prefix in self.path_prefixes)
+
+
+class MemoryBucketStore:
+    """
+    Token buckets held in process memory, for a single node
+    Buckets are kept in least recently used order, so the one evicted when full is the idlest
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                while len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = [float(capacity), now]
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (1 - tokens) / refill_per_second
+
+
+class RedisBucketStore:
+    """
+    Token buckets shared between nodes through Redis
+    """
+
+    TAKE_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(self.TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        allowed, tokens = await self._take(keys=[self.prefix + key], args=[capacity, refill_per_second, time.time()])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / refill_per_second
+
+
+def get_bucket_store():
+    """Use Redis when RATE_LIMIT_REDIS_URL is set, otherwise the in-memory stand-in"""
+    url = get_settings().rate_limit_redis_url
+    if url:
+        return RedisBucketStore(url)
+    return MemoryBucketStore()
+
+
+DEFAULT_RULES = [
+    RateLimitRule("auth", capacity=10, refill_per_second=10 / 60,
+                  path_prefixes=["/api/v1/auth/login", "/api/v1/auth/register"]),
+    RateLimitRule("upload", capacity=20, refill_per_second=20 / 60,
+                  path_prefixes=["/api/v1/files/upload"]),
+    RateLimitRule("default", capacity=200, refill_per_second=50),
+]
+
+
+class RateLimiter:
+    """
+    Applies per-IP and per-user token buckets for each route group
+    """
+
+    def __init__(self, store=None, rules: List[RateLimitRule] = None):
+        self._store = store
+        self.rules = rules or DEFAULT_RULES
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.allowed: Dict[str, int] = defaultdict(int)
+
+    @property
+    def store(self):
+        # Created on first request so importing the module opens no connections
+        if self._store is None:
+            self._store = get_bucket_store()
+        return self._store
+
+    def rule_for(self, path: str) -> RateLimitRule:
+        for rule in self.rules:
+            if rule.matches(path):
+                return rule
+        return self.rules[-1]
+
+    async def check(self, path: str, client_ip: str,
+                    resolve_user: Callable[[], Optional[str]] = None) -> Tuple[bool, float, RateLimitRule]:
+        """
+        Check the IP bucket first, then the user bucket for authenticated requests
+        resolve_user is only called once the IP bucket has allowed the request,
+        so requests rejected by IP never pay for token verification.
+        """
+        rule = self.rule_for(path)
+        allowed, retry_after = await self.store.take(
+            f"{rule.group}:ip:{client_ip}", rule.capacity, rule.refill_per_second
+        )
+        user = resolve_user() if allowed and resolve_user else None
+        if user:
+            allowed, retry_after = await self.store.take(
+                f"{rule.group}:user:{user}", rule.capacity, rule.refill_per_second
+            )
+        if allowed:
+            self.allowed[rule.group] += 1
+        else:
+            self.rejected[rule.group] += 1
+        return allowed, retry_after, rule
+
+    def metrics(self) -> dict:
+        return {
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+        }
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that rejects requests over their rate limit with 429
+    """
+
+    def __init__(self, app, limiter: RateLimiter = None, trusted_proxies: List[str] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+        proxies = trusted_proxies if trusted_proxies is not None else get_settings().trusted_proxies
+        self.trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+    def _is_trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def _client_ip(self, scope) -> str:
+        """
+        The peer address, or for requests through trusted proxies the nearest untrusted
+        X-Forwarded-For entry; entries left of it are client-supplied and ignored
+        """
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        if not self.trusted_proxies or not self._is_trusted(peer):
+            return peer
+        forwarded = [
+            value.decode("latin-1") for name, value in scope.get("headers", []) if name == b"x-forwarded-for"
+        ]
+        hops = [hop.strip() for hop in ",".join(forwarded).split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self._is_trusted(hop):
+                return hop
+        return hops[0] if hops else peer
+
+    @staticmethod
+    def _token_subject(headers: list) -> Optional[str]:
+        for name, value in headers:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                try:
+                    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+                except JWTError:
+                    return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = scope.get("headers", [])
+        allowed, retry_after, rule = await self.limiter.check(
+            scope["path"], self._client_ip(scope), lambda: self._token_subject(headers)
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                (b"x-ratelimit-group", rule.group.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# Global instance
+rate_limiter = RateLimiter()
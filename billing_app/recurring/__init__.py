@@ -0,0 +1 @@
+# Recurring billing package
@@ -0,0 +1,153 @@
+import re
+from typing import List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from billing_app.models.database import Invoice, User
+
+# The invoice_search table is created by migrations 0006 and 0007: an FTS5 table keyed by invoice
+# id on SQLite, or a tsvector document with GIN and trigram indexes on Postgres. Both carry the
+# invoice's tenant so searches stay within one tenant. On SQLite, invoice number fragments are
+# matched through a second, trigram-tokenized FTS5 table from migration 0011.
+
+SEARCH_COLUMNS = "{invoice_number description customer_name customer_email}"
+
+# Trigram matching needs at least three characters
+MIN_FRAGMENT_LENGTH = 3
+
+
+class InvoiceSearchIndex:
+    """
+    Full-text and prefix search over invoices and their customers
+    """
+
+    @staticmethod
+    def terms(query: str) -> List[str]:
+        """Split a free-text query into word terms; everything else is dropped"""
+        return re.findall(r"\w+", query.lower())
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    @staticmethod
+    def _dialect(db_or_bind) -> str:
+        bind = db_or_bind.get_bind() if isinstance(db_or_bind, Session) else db_or_bind
+        return bind.dialect.name
+
+    def index_invoices(self, db: Session, invoice_ids: Sequence[int]):
+        """
+        Add or refresh index entries for invoices
+        Runs inside the caller's transaction so the index commits with the invoice
+        """
+        if not invoice_ids:
+            return
+        rows = db.query(
+            Invoice.id, Invoice.tenant_id, Invoice.invoice_number, Invoice.description, User.full_name, User.email
+        ).join(User, Invoice.customer_id == User.id).filter(Invoice.id.in_(invoice_ids)).all()
+        params = [
+            {
+                "id": row.id,
+                "tenant_id": row.tenant_id,
+                "tenant": f"t{row.tenant_id}",
+                "invoice_number": row.invoice_number,
+                "description": row.description or "",
+                "customer_name": row.full_name or "",
+                "customer_email": row.email or "",
+            }
+            for row in rows
+        ]
+        if not params:
+            return
+
+        if self._dialect(db) == "postgresql":
+            db.execute(text("""
+                INSERT INTO invoice_search (invoice_id, tenant_id, invoice_number, document)
+                VALUES (:id, :tenant_id, :invoice_number,
+                        setweight(to_tsvector('simple', :invoice_number), 'A') ||
+                        setweight(to_tsvector('simple', :customer_name || ' ' || :customer_email), 'B') ||
+                        setweight(to_tsvector('simple', :description), 'C'))
+                ON CONFLICT (invoice_id) DO UPDATE
+                SET tenant_id = EXCLUDED.tenant_id, invoice_number = EXCLUDED.invoice_number,
+                    document = EXCLUDED.document
+            """), params)
+        else:
+            db.execute(text("DELETE FROM invoice_search WHERE rowid = :id"), params)
+            db.execute(text("""
+                INSERT INTO invoice_search (rowid, invoice_number, description, customer_name, customer_email, tenant)
+                VALUES (:id, :invoice_number, :description, :customer_name, :customer_email, :tenant)
+            """), params)
+            db.execute(text("DELETE FROM invoice_number_search WHERE rowid = :id"), params)
+            db.execute(text("""
+                INSERT INTO invoice_number_search (rowid, invoice_number, tenant_id)
+                VALUES (:id, :invoice_number, :tenant_id)
+            """), params)
+
+    def search_ids(self, db: Session, query: str, limit: int = 20, offset: int = 0) -> List[int]:
+        """Return matching invoice ids, best match first, within the session's tenant"""
+        tenant_id = db.info.get("tenant_id")
+        if tenant_id is None:
+            # The index spans every tenant; never search it unscoped
+            raise RuntimeError("Invoice search requires a tenant-scoped session")
+        terms = self.terms(query)
+        if not terms:
+            return []
+
+        if self._dialect(db) == "postgresql":
+            tsquery = " & ".join(f"{term}:*" for term in terms)
+            rows = db.execute(text("""
+                SELECT invoice_id FROM invoice_search
+                WHERE tenant_id = :tenant_id
+                  AND (document @@ to_tsquery('simple', :tsquery) OR invoice_number ILIKE :fragment)
+                ORDER BY ts_rank(document, to_tsquery('simple', :tsquery)) DESC, invoice_id DESC
+                LIMIT :limit OFFSET :offset
+            """), {
+                "tenant_id": tenant_id,
+                "tsquery": tsquery,
+                "fragment": f"%{self._escape_like(query.strip())}%",
+                "limit": limit,
+                "offset": offset,
+            })
+        else:
+            # Each term is a quoted prefix query on the text columns; terms are ANDed together
+            match = f"{SEARCH_COLUMNS} : (" + " ".join(f'"{term}"*' for term in terms) + ")"
+            match = f"tenant : t{int(tenant_id)} AND {match}"
+            params = {"match": match, "limit": limit, "offset": offset}
+            fragment = query.strip()
+            if len(fragment) < MIN_FRAGMENT_LENGTH:
+                rows = db.execute(text("""
+                    SELECT rowid FROM invoice_search
+                    WHERE invoice_search MATCH :match
+                    ORDER BY bm25(invoice_search, 10.0, 1.0, 5.0, 5.0, 0.0), rowid DESC
+                    LIMIT :limit OFFSET :offset
+                """), params)
+            else:
+                # Invoice number fragments ("024" in INV-2024-0001) come from the trigram table
+                # and rank after word matches, whose bm25 scores are negative
+                params.update(fragment='"' + fragment.replace('"', '""') + '"', tenant_id=tenant_id)
+                rows = db.execute(text("""
+                    SELECT id FROM (
+                        SELECT rowid AS id, bm25(invoice_search, 10.0, 1.0, 5.0, 5.0, 0.0) AS rank
+                        FROM invoice_search WHERE invoice_search MATCH :match
+                        UNION ALL
+                        SELECT rowid AS id, 0.0 AS rank
+                        FROM invoice_number_search
+                        WHERE invoice_number_search MATCH :fragment AND tenant_id = :tenant_id
+                    )
+                    GROUP BY id
+                    ORDER BY min(rank), id DESC
+                    LIMIT :limit OFFSET :offset
+                """), params)
+        return [row[0] for row in rows]
+
+    def search(self, db: Session, query: str, limit: int = 20, offset: int = 0) -> List[Invoice]:
+        """Return matching invoices in rank order"""
+        ids = self.search_ids(db, query, limit, offset)
+        if not ids:
+            return []
+        invoices = {invoice.id: invoice for invoice in db.query(Invoice).filter(Invoice.id.in_(ids))}
+        return [invoices[i] for i in ids if i in invoices]
+
+# Global instance
+invoice_search = InvoiceSearchIndex()
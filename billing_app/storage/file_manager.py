@@ -4,17 +4,34 @@ import aiofiles
 from typing import Optional
 from fastapi import UploadFile, HTTPException
 
+from billing_app.config import get_settings
+
 class FileStorageManager:
     """
     File storage manager for handling file uploads and downloads
     """
     
+    # Accepted file types (you can customize this based on your needs)
+    ALLOWED_TYPES = [
+        'image/jpeg', 'image/png', 'image/gif',
+        'application/pdf',
+        'text/plain', 'text/csv',
+        'application/vnd.ms-excel',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ]
+    
     def __init__(self, upload_dir: str = None, max_file_size: int = None):
-        self.upload_dir = upload_dir or os.getenv("UPLOAD_DIR", "./uploads")
-        self.max_file_size = max_file_size or int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
-        
-        # Create upload directory if it doesn't exist
-        os.makedirs(self.upload_dir, exist_ok=True)
+        settings = get_settings()
+        self.upload_dir = upload_dir or settings.upload_dir
+        self.max_file_size = max_file_size or settings.max_file_size
+        self._dir_ready = False
+    
+    def ensure_upload_dir(self) -> str:
+        """Create the upload directory if it doesn't exist"""
+        if not self._dir_ready:
+            os.makedirs(self.upload_dir, exist_ok=True)
+            self._dir_ready = True
+        return self.upload_dir
     
     def validate_file(self, file: UploadFile) -> bool:
         """Validate file before upload"""
@@ -22,16 +39,8 @@ class FileStorageManager:
         if file.size > self.max_file_size:
             raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {self.max_file_size} bytes")
         
-        # Check file type (you can customize this based on your needs)
-        allowed_types = [
-            'image/jpeg', 'image/png', 'image/gif',
-            'application/pdf',
-            'text/plain', 'text/csv',
-            'application/vnd.ms-excel',
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        ]
-        
-        if file.content_type not in allowed_types:
+        # Check file type
+        if file.content_type not in self.ALLOWED_TYPES:
             raise HTTPException(status_code=415, detail="File type not allowed")
         
         return True
@@ -46,7 +55,7 @@ class FileStorageManager:
         self.validate_file(file)
         
         unique_filename = self.generate_unique_filename(file.filename)
-        file_path = os.path.join(self.upload_dir, unique_filename)
+        file_path = os.path.join(self.ensure_upload_dir(), unique_filename)
         
         try:
             async with aiofiles.open(file_path, 'wb') as f:
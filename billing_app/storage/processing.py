@@ -0,0 +1,189 @@
+import os
+import csv
+import json
+import asyncio
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from billing_app.config import get_settings
+from billing_app.models.database import FileStorage
+from billing_app.storage.file_manager import FileStorageManager, file_storage
+from billing_app.tenancy.session import tenant_router
+
+# Types libmagic may report for files whose declared type is allowed
+SNIFFED_ALIASES = {
+    'application/csv': 'text/csv',
+    'application/zip': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/x-ole-storage': 'application/vnd.ms-excel',
+    'application/CDFV2': 'application/vnd.ms-excel',
+}
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+def sniff_content_type(file_path: str) -> str:
+    """Detect the MIME type from the file's magic bytes"""
+    import magic
+
+    return magic.from_file(file_path, mime=True)
+
+
+def types_compatible(declared: Optional[str], detected: str) -> bool:
+    """Check that the sniffed type agrees with the type the client declared"""
+    detected = SNIFFED_ALIASES.get(detected, detected)
+    if detected == declared:
+        return True
+    # libmagic cannot tell CSV from plain text reliably
+    return declared in ('text/plain', 'text/csv') and detected in ('text/plain', 'text/csv')
+
+
+def make_thumbnail(file_path: str, thumbnail_dir: str) -> dict:
+    """Write a thumbnail next to the upload and return image metadata"""
+    from PIL import Image
+
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    with Image.open(file_path) as image:
+        metadata = {'width': image.width, 'height': image.height, 'format': image.format, 'mode': image.mode}
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        thumbnail_path = os.path.join(thumbnail_dir, os.path.splitext(os.path.basename(file_path))[0] + '.jpg')
+        image.save(thumbnail_path, 'JPEG', quality=85)
+    metadata['thumbnail_path'] = thumbnail_path
+    return metadata
+
+
+def csv_metadata(file_path: str) -> dict:
+    """Read the header and count rows without loading the file into memory"""
+    with open(file_path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = sum(1 for _ in reader)
+    return {'columns': header, 'rows': rows}
+
+
+def xlsx_metadata(file_path: str) -> dict:
+    """Read sheet names and dimensions in read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheets = [{'name': ws.title, 'rows': ws.max_row, 'columns': ws.max_column} for ws in workbook.worksheets]
+    finally:
+        workbook.close()
+    return {'sheets': sheets}
+
+
+def process_file(file_path: str, declared_type: Optional[str], thumbnail_dir: str) -> dict:
+    """
+    Verify and inspect an uploaded file
+    Runs in a worker process; returns a plain dict describing the result
+    """
+    detected = sniff_content_type(file_path)
+    canonical = SNIFFED_ALIASES.get(detected, detected)
+    if canonical not in FileStorageManager.ALLOWED_TYPES or not types_compatible(declared_type, detected):
+        return {'status': 'rejected', 'detected_type': detected, 'metadata': {}}
+
+    metadata = {}
+    if canonical.startswith('image/'):
+        metadata = make_thumbnail(file_path, thumbnail_dir)
+    elif canonical == 'text/csv':
+        metadata = csv_metadata(file_path)
+    elif canonical == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
+        metadata = xlsx_metadata(file_path)
+    return {'status': 'done', 'detected_type': canonical, 'metadata': metadata}
+
+
+class UploadProcessor:
+    """
+    Runs post-upload processing in a bounded pool of worker processes
+    """
+
+    def __init__(self, max_workers: int = None, thumbnail_dir: str = None):
+        self.max_workers = max_workers or get_settings().upload_processing_workers
+        self.thumbnail_dir = thumbnail_dir or os.path.join(file_storage.upload_dir, "thumbnails")
+        self._executor = None
+        self._semaphore = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the module does not fork workers
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    @staticmethod
+    def _load_file(file_id: int, tenant_id: int) -> Optional[tuple]:
+        db = tenant_router.open_session(tenant_id)
+        try:
+            db_file = db.query(FileStorage).filter(FileStorage.id == file_id).first()
+            if db_file is None:
+                return None
+            return db_file.file_path, db_file.content_type, db_file.filename
+        finally:
+            db.close()
+
+    @staticmethod
+    def _set_status(file_id: int, tenant_id: int, **fields):
+        db = tenant_router.open_session(tenant_id)
+        try:
+            db.query(FileStorage).filter(FileStorage.id == file_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+
+    async def process(self, file_id: int, tenant_id: int):
+        """Process a stored upload and record the outcome on its FileStorage row"""
+        # Database and file operations block, so they run on the thread pool rather than the event loop
+        loaded = await run_in_threadpool(self._load_file, file_id, tenant_id)
+        if loaded is None:
+            return
+        file_path, declared_type, filename = loaded
+
+        async with self._get_semaphore():
+            await run_in_threadpool(self._set_status, file_id, tenant_id, processing_status="processing")
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(
+                    self._get_executor(), process_file, file_path, declared_type, self.thumbnail_dir
+                )
+            except Exception as e:
+                await run_in_threadpool(
+                    self._set_status,
+                    file_id,
+                    tenant_id,
+                    processing_status="failed",
+                    file_metadata=json.dumps({"error": str(e)}),
+                    processed_at=datetime.utcnow(),
+                )
+                return
+
+        metadata = result["metadata"]
+        if result["status"] == "rejected":
+            # Content does not match the declared type; stop serving it
+            await run_in_threadpool(file_storage.delete_file, filename)
+        await run_in_threadpool(
+            self._set_status,
+            file_id,
+            tenant_id,
+            processing_status=result["status"],
+            detected_type=result["detected_type"],
+            thumbnail_path=metadata.pop("thumbnail_path", None),
+            file_metadata=json.dumps(metadata),
+            processed_at=datetime.utcnow(),
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+upload_processor = UploadProcessor()
@@ -0,0 +1 @@
+# Tenancy package
@@ -0,0 +1,134 @@
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, with_loader_criteria
+
+from billing_app.config import get_settings
+from billing_app.models.database import get_db, SessionLocal, Tenant, TenantScoped, User
+from billing_app.models.replicas import replica_router
+from billing_app.auth.auth_handler import get_current_verified_user, get_current_verified_user_for_read
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(execute_state):
+    """Add a tenant filter to every ORM query on a session bound to a tenant"""
+    tenant_id = execute_state.session.info.get("tenant_id")
+    if tenant_id is None:
+        return
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_tenant(session, flush_context, instances):
+    """Stamp new rows with the session's tenant"""
+    tenant_id = session.info.get("tenant_id")
+    if tenant_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, TenantScoped) and obj.tenant_id is None:
+            obj.tenant_id = tenant_id
+
+
+class TenantRouter:
+    """
+    Routes tenants to their database
+    Tenants without a database_url share the primary database
+    """
+
+    def __init__(self, cache_ttl: int = None):
+        self.cache_ttl = cache_ttl or get_settings().tenant_cache_ttl
+        self._urls: Dict[int, Tuple[Optional[str], float]] = {}
+        self._factories: Dict[str, sessionmaker] = {}
+        self._lock = threading.Lock()
+
+    def database_url_for(self, tenant_id: int, db: Session = None) -> Optional[str]:
+        """Look up a tenant's database_url, cached for cache_ttl seconds"""
+        cached = self._urls.get(tenant_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        # Tenant records always live in the primary database
+        primary = db or SessionLocal()
+        try:
+            row = primary.query(Tenant.database_url).filter(Tenant.id == tenant_id).first()
+        finally:
+            if db is None:
+                primary.close()
+        url = row.database_url if row else None
+        self._urls[tenant_id] = (url, time.monotonic() + self.cache_ttl)
+        return url
+
+    def sessionmaker_for(self, database_url: Optional[str]) -> sessionmaker:
+        if not database_url:
+            return SessionLocal
+        with self._lock:
+            factory = self._factories.get(database_url)
+            if factory is None:
+                tenant_engine = create_engine(
+                    database_url,
+                    connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
+                )
+                factory = self._factories[database_url] = sessionmaker(
+                    autocommit=False, autoflush=False, bind=tenant_engine
+                )
+        return factory
+
+    def open_session(self, tenant_id: int) -> Session:
+        """Open a session on the tenant's database, scoped to the tenant"""
+        db = self.sessionmaker_for(self.database_url_for(tenant_id))()
+        db.info["tenant_id"] = tenant_id
+        return db
+
+# Global instance
+tenant_router = TenantRouter()
+
+
+def get_tenant_db(
+    current_user: User = Depends(get_current_verified_user),
+    db: Session = Depends(get_db)
+):
+    """Database session scoped to the current user's tenant"""
+    database_url = tenant_router.database_url_for(current_user.tenant_id, db)
+    if not database_url:
+        # Tenant lives in the primary database; reuse the request's session
+        db.info["tenant_id"] = current_user.tenant_id
+        yield db
+        return
+
+    tenant_db = tenant_router.sessionmaker_for(database_url)()
+    tenant_db.info["tenant_id"] = current_user.tenant_id
+    try:
+        yield tenant_db
+    finally:
+        tenant_db.close()
+
+
+def get_tenant_read_db(
+    request: Request,
+    current_user: User = Depends(get_current_verified_user_for_read)
+):
+    """
+    Read-only session scoped to the current user's tenant
+    Served by a read replica unless the tenant has its own database or the client wrote recently;
+    neither the user nor the tenant lookup touches the primary unless the user wrote recently
+    """
+    sticky = replica_router.stick_to_primary(
+        current_user.username, request.cookies.get(replica_router.STICKY_COOKIE)
+    )
+    read_db = replica_router.read_session(sticky)
+    database_url = tenant_router.database_url_for(current_user.tenant_id, read_db)
+    if database_url:
+        read_db.close()
+        read_db = tenant_router.sessionmaker_for(database_url)()
+    read_db.info["tenant_id"] = current_user.tenant_id
+    try:
+        yield read_db
+    finally:
+        read_db.close()
@@ -57,5 +57,24 @@ class WebSocketManager:
             "timestamp": str(datetime.utcnow())
         })
         await self.broadcast(message)
+    
+    async def send_import_progress(self, job_id: int, status: str, processed_rows: int,
+                                   imported_count: int, error_count: int, client_id: str = None):
+        message = json.dumps({
+            "type": "import_progress",
+            "job_id": job_id,
+            "status": status,
+            "processed_rows": processed_rows,
+            "imported_count": imported_count,
+            "error_count": error_count,
+            "timestamp": str(datetime.utcnow())
+        })
+        
+        # Progress is private to the job owner; without a client_id there is nobody to tell
+        if client_id:
+            await self.send_personal_message(message, client_id)
 
 from datetime import datetime
+
+# Global instance
+ws_manager = WebSocketManager()
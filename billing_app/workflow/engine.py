@@ -1,8 +1,13 @@
+from sqlalchemy import insert, delete, select
 from sqlalchemy.orm import Session
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional, Sequence
+from datetime import datetime, timedelta
+import base64
+import csv
+import gzip
 
-from billing_app.models.database import WorkflowLog, Invoice
+from billing_app.models.database import WorkflowLog, WorkflowLogArchive, Invoice
+from billing_app.cache.response_cache import invoice_cache
 
 class WorkflowEngine:
     """
@@ -27,6 +32,11 @@ class WorkflowEngine:
         """Get all valid transitions from a given status"""
         return cls.VALID_TRANSITIONS.get(from_status, [])
     
+    @classmethod
+    def is_terminal(cls, status: str) -> bool:
+        """Check if a status has no outgoing transitions"""
+        return status in cls.VALID_TRANSITIONS and not cls.VALID_TRANSITIONS[status]
+    
     @classmethod
     def transition_invoice(cls, db: Session, invoice_id: int, to_status: str, user_id: int, notes: str = None) -> bool:
         """
@@ -47,8 +57,41 @@ class WorkflowEngine:
         cls.log_action(db, invoice_id, "status_transition", old_status, to_status, user_id, notes)
         
         db.commit()
+        invoice_cache.invalidate((invoice.tenant_id, invoice_id))
         return True
     
+    @classmethod
+    def transition_invoices(cls, db: Session, invoice_ids: Sequence[int], to_status: str,
+                            user_id: Optional[int], notes: str = None) -> List[int]:
+        """
+        Transition many invoices at once, for batch jobs
+        Invoices whose current status does not allow the transition are skipped.
+        Does not commit; returns the ids that were transitioned
+        """
+        rows = db.query(Invoice.id, Invoice.status, Invoice.tenant_id).filter(Invoice.id.in_(invoice_ids)).all()
+        allowed = [row for row in rows if cls.can_transition(row.status, to_status)]
+        if not allowed:
+            return []
+        
+        ids = [row.id for row in allowed]
+        db.query(Invoice).filter(Invoice.id.in_(ids)).update(
+            {Invoice.status: to_status, Invoice.version: Invoice.version + 1}, synchronize_session=False
+        )
+        db.execute(insert(WorkflowLog), [
+            {
+                "invoice_id": row.id,
+                "action": "status_transition",
+                "from_status": row.status,
+                "to_status": to_status,
+                "user_id": user_id,
+                "notes": notes,
+            }
+            for row in allowed
+        ])
+        for row in allowed:
+            invoice_cache.invalidate((row.tenant_id, row.id))
+        return ids
+    
     @classmethod
     def log_action(cls, db: Session, invoice_id: int, action: str, from_status: Optional[str], 
                    to_status: Optional[str], user_id: Optional[int], notes: Optional[str] = None):
@@ -69,6 +112,105 @@ class WorkflowEngine:
         """Get the workflow history for an invoice"""
         return db.query(WorkflowLog).filter(WorkflowLog.invoice_id == invoice_id).order_by(WorkflowLog.created_at).all()
     
+    @staticmethod
+    def encode_cursor(log_id: int) -> str:
+        return base64.urlsafe_b64encode(str(log_id).encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> int:
+        try:
+            # Older cursors were "created_at|id"; the id alone still positions them correctly
+            return int(base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)[-1])
+        except Exception:
+            raise ValueError("Invalid cursor")
+    
+    @classmethod
+    def _history_query(cls, db: Session, model, invoice_id: int, after: Optional[int], limit: int):
+        query = db.query(model).filter(model.invoice_id == invoice_id)
+        if after is not None:
+            query = query.filter(model.id > after)
+        return query.order_by(model.id).limit(limit).all()
+    
+    @classmethod
+    def get_workflow_history_page(cls, db: Session, invoice_id: int, limit: int = 50, cursor: str = None):
+        """
+        Get one page of workflow history, oldest first
+        Uses keyset pagination on id, which increases with insertion order in both tables, so every
+        page is an index range scan. created_at is not used: on SQLite it has one-second resolution
+        and does not compare equal to its own bound value, which dropped rows logged in the same second.
+        Archived logs are always older than live ones, so the archive is read first.
+        Returns (logs, next_cursor)
+        """
+        after = cls.decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether another page exists
+        logs = cls._history_query(db, WorkflowLogArchive, invoice_id, after, limit + 1)
+        if len(logs) <= limit:
+            live_after = logs[-1].id if logs else after
+            logs += cls._history_query(db, WorkflowLog, invoice_id, live_after, limit + 1 - len(logs))
+        
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = cls.encode_cursor(logs[-1].id)
+        return logs, next_cursor
+    
+    LOG_COLUMNS = ["id", "invoice_id", "action", "from_status", "to_status", "user_id", "notes", "created_at"]
+    
+    @classmethod
+    def archive_workflow_logs(cls, db: Session, older_than_days: int = 90, batch_size: int = 10000) -> int:
+        """
+        Move workflow logs older than the retention window into workflow_logs_archive
+        Runs in batches so each transaction stays short. This should be run as a scheduled task
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        columns = [getattr(WorkflowLog, name) for name in cls.LOG_COLUMNS]
+        moved = 0
+        while True:
+            ids = [log_id for (log_id,) in db.query(WorkflowLog.id).filter(
+                WorkflowLog.created_at < cutoff
+            ).order_by(WorkflowLog.id).limit(batch_size)]
+            if not ids:
+                break
+            db.execute(insert(WorkflowLogArchive).from_select(
+                cls.LOG_COLUMNS, select(*columns).where(WorkflowLog.id.in_(ids))
+            ))
+            db.execute(delete(WorkflowLog).where(WorkflowLog.id.in_(ids)))
+            db.commit()
+            moved += len(ids)
+        return moved
+    
+    @classmethod
+    def export_archived_logs(cls, db: Session, before: datetime, path: str, batch_size: int = 10000) -> int:
+        """
+        Export archived logs created before a date to a gzipped CSV file and remove them from the archive
+        """
+        exported = 0
+        last_id = 0
+        with gzip.open(path, "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(cls.LOG_COLUMNS)
+            while True:
+                logs = db.query(WorkflowLogArchive).filter(
+                    WorkflowLogArchive.created_at < before, WorkflowLogArchive.id > last_id
+                ).order_by(WorkflowLogArchive.id).limit(batch_size).all()
+                if not logs:
+                    break
+                for log in logs:
+                    writer.writerow([
+                        log.created_at.isoformat() if name == "created_at" else getattr(log, name)
+                        for name in cls.LOG_COLUMNS
+                    ])
+                last_id = logs[-1].id
+                exported += len(logs)
+                db.expunge_all()
+        
+        # Only delete once the export file is complete
+        db.execute(delete(WorkflowLogArchive).where(
+            WorkflowLogArchive.created_at < before, WorkflowLogArchive.id <= last_id
+        ))
+        db.commit()
+        return exported
+    
     @classmethod
     def auto_mark_overdue(cls, db: Session):
         """
@@ -86,6 +228,7 @@ class WorkflowEngine:
             if cls.can_transition(invoice.status, "overdue"):
                 invoice.status = "overdue"
                 cls.log_action(db, invoice.id, "auto_overdue", "sent", "overdue", None, "Automatically marked as overdue")
+                invoice_cache.invalidate((invoice.tenant_id, invoice.id))
         
         db.commit()
         return len(overdue_invoices)
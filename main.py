@@ -1,27 +1,62 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import time
+
+_import_started = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-import os
-from dotenv import load_dotenv
 
-from billing_app.auth.auth_handler import AuthHandler
+from billing_app.config import get_settings
 from billing_app.api.routes import router
-from billing_app.websockets.ws_manager import WebSocketManager
-from billing_app.models.database import engine, Base
+from billing_app.websockets.ws_manager import ws_manager
+from billing_app.models.database import run_migrations
+from billing_app.models.replicas import ReadYourWritesMiddleware, replica_router
+from billing_app.ratelimit.limiter import RateLimitMiddleware, rate_limiter
+from billing_app.storage.file_manager import file_storage
+from billing_app.storage.processing import upload_processor
 
-load_dotenv()
+settings = get_settings()
+startup_stats = {}
+logger = logging.getLogger(__name__)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes are applied by `alembic upgrade head`, not on every worker start
+    if settings.auto_migrate:
+        run_migrations()
+    file_storage.ensure_upload_dir()
+    
+    startup_ms = (time.perf_counter() - _import_started) * 1000
+    startup_stats["startup_ms"] = round(startup_ms, 1)
+    if startup_ms > settings.startup_budget_ms:
+        logger.warning("Startup took %.0f ms, over the %d ms budget", startup_ms, settings.startup_budget_ms)
+    
+    yield
+    
+    upload_processor.shutdown()
+    replica_router.shutdown()
 
 app = FastAPI(
-    title=os.getenv("APP_NAME", "Billing Application"),
-    version=os.getenv("VERSION", "1.0.0"),
-    description="A comprehensive billing application with authentication, validation, and workflow management"
+    title=settings.app_name,
+    version=settings.version,
+    description="A comprehensive billing application with authentication, validation, and workflow management",
+    lifespan=lifespan
 )
 
+# Middleware added last runs first, so CORS is added last and wraps every other response,
+# including 429s from the rate limiter
+
+# Keep clients that just wrote on the primary
+if settings.database_replica_urls:
+    app.add_middleware(ReadYourWritesMiddleware, router=replica_router)
+
+# Rate limiting middleware
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,21 +66,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directory
-upload_dir = os.getenv("UPLOAD_DIR", "./uploads")
-os.makedirs(upload_dir, exist_ok=True)
-
-# Mount static files
-app.mount("/uploads", StaticFiles(directory=upload_dir), name="uploads")
+# Mount static files; the directory is created during startup
+app.mount("/uploads", StaticFiles(directory=settings.upload_dir, check_dir=False), name="uploads")
 
 # Include routers
 app.include_router(router, prefix="/api/v1")
 
-# WebSocket manager
-ws_manager = WebSocketManager()
-
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket, client_id: str):
+async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await ws_manager.connect(websocket, client_id)
     try:
         while True:
@@ -60,7 +88,7 @@ async def websocket_endpoint(websocket, client_id: str):
 async def root():
     return {
         "message": "Welcome to the Billing Application API",
-        "version": os.getenv("VERSION", "1.0.0"),
+        "version": settings.version,
         "docs": "/docs"
     }
 
@@ -68,10 +96,18 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "billing-app"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "rate_limit": rate_limiter.metrics(),
+        "startup": startup_stats,
+        "replicas": replica_router.status()
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=os.getenv("DEBUG", "False").lower() == "true"
+        reload=settings.debug
     )
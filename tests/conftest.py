@@ -0,0 +1,69 @@
+import os
+import sys
+import uuid
+import tempfile
+
+import pytest
+
+# Settings and engines are built at import time, so the test environment is set up first
+_workdir = tempfile.mkdtemp(prefix="billing-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    AUTO_MIGRATE="True",
+    RATE_LIMIT_ENABLED="False",
+    DATABASE_REPLICA_URLS="",
+    UPLOAD_DIR=os.path.join(_workdir, "uploads"),
+    IMPORT_REPORT_DIR=os.path.join(_workdir, "import_reports"),
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from billing_app.models.database import SessionLocal, User
+
+PASSWORD = "Passw0rd1"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def make_user(client):
+    """
+    Register, verify and log in a user through the API; returns (auth headers, user id)
+
+    Without an invite the user starts a new tenant. The verification token stands in for the
+    confirmation email, so it is the only thing read from the database.
+    """
+    def make_user(invite_token: str = None):
+        username = f"user{uuid.uuid4().hex[:8]}"
+        payload = {"username": username, "email": f"{username}@example.com", "password": PASSWORD}
+        if invite_token:
+            payload["invite_token"] = invite_token
+        response = client.post("/api/v1/auth/register", json=payload)
+        assert response.status_code == 200, response.text
+
+        session = SessionLocal()
+        try:
+            user = session.query(User).filter(User.username == username).first()
+            token, user_id = user.verification_token, user.id
+        finally:
+            session.close()
+        client.post(f"/api/v1/auth/verify/{token}")
+
+        response = client.post("/api/v1/auth/login", data={"username": username, "password": PASSWORD})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}, user_id
+    return make_user
@@ -0,0 +1,55 @@
+import uuid
+
+from billing_app.models.database import SessionLocal, User
+
+
+def test_user_etag_changes_when_the_user_is_written(client):
+    username = f"user{uuid.uuid4().hex[:8]}"
+    client.post("/api/v1/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "Passw0rd1"
+    })
+    token = client.post("/api/v1/auth/login", data={"username": username, "password": "Passw0rd1"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    first = client.get("/api/v1/auth/me", headers=headers)
+    etag = first.headers["etag"]
+    assert first.json()["is_verified"] is False
+    assert client.get("/api/v1/auth/me", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # Verification lands within the same second as registration; the version still moves the ETag
+    session = SessionLocal()
+    try:
+        verification = session.query(User.verification_token).filter(User.username == username).scalar()
+    finally:
+        session.close()
+    client.post(f"/api/v1/auth/verify/{verification}")
+
+    second = client.get("/api/v1/auth/me", headers={**headers, "If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert second.json()["is_verified"] is True
+
+
+def test_invoice_etag_and_terminal_caching(client, make_user):
+    headers, user_id = make_user()
+    invoice_id = client.post("/api/v1/invoices", headers=headers, json={
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}", "customer_id": user_id,
+        "items": [{"description": "Hours", "quantity": "1", "unit_price": "10.00"}],
+    }).json()["id"]
+    url = f"/api/v1/invoices/{invoice_id}"
+
+    first = client.get(url, headers=headers)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    assert client.put(url, headers=headers, json={"description": "Updated"}).status_code == 200
+    updated = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert updated.status_code == 200
+    assert updated.json()["description"] == "Updated"
+
+    assert client.put(url, headers=headers, json={"status": "cancelled"}).status_code == 200
+    cancelled = client.get(url, headers=headers)
+    assert cancelled.headers["cache-control"].startswith("private, max-age=")
+    assert int(cancelled.headers["cache-control"].split("max-age=")[1]) > 0
+    assert client.put(url, headers=headers, json={"description": "Again"}).status_code == 409
@@ -0,0 +1,55 @@
+import uuid
+
+from billing_app.imports.invoice_import import XLSX_TYPE, iter_invoices, iter_rows, validate_batch
+from billing_app.models.database import FileStorage
+
+
+def upload(client, headers, content: bytes, filename="invoices.csv", content_type="text/csv"):
+    response = client.post("/api/v1/files/upload", headers=headers,
+                           files={"file": (filename, content, content_type)})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_import_waits_for_processing(client, db, make_user):
+    headers, user_id = make_user()
+    file_id = upload(client, headers, f"invoice_number,customer_id\nINV-1,{user_id}\n".encode())
+    db.query(FileStorage).filter(FileStorage.id == file_id).update({"processing_status": "pending"})
+    db.commit()
+
+    response = client.post("/api/v1/imports", headers=headers, json={"file_id": file_id})
+    assert response.status_code == 409
+
+
+def test_import_rejects_a_file_that_failed_verification(client, make_user):
+    headers, _ = make_user()
+    # Declared as CSV, but the bytes are a PNG
+    file_id = upload(client, headers, b"\x89PNG\r\n\x1a\n" + uuid.uuid4().bytes * 8)
+    assert client.get(f"/api/v1/files/{file_id}", headers=headers).json()["processing_status"] == "rejected"
+
+    response = client.post("/api/v1/imports", headers=headers, json={"file_id": file_id})
+    assert response.status_code == 415
+
+
+def test_xlsx_text_columns_are_read_as_strings(tmp_path):
+    from openpyxl import Workbook
+
+    path = str(tmp_path / "invoices.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["invoice_number", "customer_id", "description", "item_description", "quantity", "unit_price"])
+    sheet.append([1001, 1, 2024, 7, 2, 12.5])
+    sheet.append([1001.0, 1, 2024, 8, 1, 3])
+    workbook.save(path)
+
+    invoices = list(iter_invoices(iter_rows(path, XLSX_TYPE)))
+    assert len(invoices) == 1
+    _, count, payload = invoices[0]
+    assert count == 2
+    assert payload["invoice_number"] == "1001"
+    assert payload["description"] == "2024"
+    assert [item["description"] for item in payload["items"]] == ["7", "8"]
+
+    valid, errors = validate_batch([payload])
+    assert errors == {}
+    assert valid[0][1].invoice_number == "1001"
@@ -0,0 +1,13 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_models_match_migrations(client):
+    # Raises if autogenerate would emit any operation, such as dropping the search tables
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    command.check(config)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+import main
+from billing_app.ratelimit import limiter as limiter_module
+from billing_app.ratelimit.limiter import MemoryBucketStore, RateLimiter, RateLimitMiddleware, RateLimitRule
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(limiter_module, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def take(store, key="k", capacity=2, refill=1.0):
+    return asyncio.run(store.take(key, capacity, refill))
+
+
+def test_bucket_allows_capacity_then_refills(clock):
+    store = MemoryBucketStore()
+    assert take(store) == (True, 0.0)
+    assert take(store) == (True, 0.0)
+    allowed, retry_after = take(store)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+
+    clock[0] += 0.5
+    allowed, retry_after = take(store)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert take(store)[0]
+    # Refill never goes past capacity
+    clock[0] += 60
+    assert [take(store)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_bucket_store_evicts_the_least_recently_used_key(clock):
+    store = MemoryBucketStore(max_keys=2)
+    take(store, "a", capacity=1)
+    take(store, "b", capacity=1)
+    take(store, "a", capacity=1)
+    take(store, "c", capacity=1)
+    # "b" was idlest, so it was evicted and starts with a full bucket again
+    assert take(store, "b", capacity=1)[0]
+    assert not take(store, "c", capacity=1)[0]
+
+
+def test_user_bucket_is_only_checked_after_the_ip_bucket_allows(clock):
+    limiter = RateLimiter(store=MemoryBucketStore(), rules=[RateLimitRule("default", capacity=1, refill_per_second=1)])
+    calls = []
+
+    def resolve_user():
+        calls.append(1)
+        return "alice"
+
+    assert asyncio.run(limiter.check("/api/v1/invoices", "10.0.0.1", resolve_user))[0]
+    assert calls == [1]
+    allowed, _, _ = asyncio.run(limiter.check("/api/v1/invoices", "10.0.0.1", resolve_user))
+    assert not allowed
+    assert calls == [1]
+
+    # A new IP passes its own bucket, then the user's empty bucket rejects it
+    allowed, _, _ = asyncio.run(limiter.check("/api/v1/invoices", "10.0.0.2", resolve_user))
+    assert not allowed
+    assert calls == [1, 1]
+
+
+def scope(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "client": (peer, 1234), "headers": headers}
+
+
+def test_forwarded_for_is_only_trusted_from_trusted_proxies():
+    middleware = RateLimitMiddleware(None, limiter=RateLimiter(), trusted_proxies=["10.0.0.0/8"])
+    assert middleware._client_ip(scope("203.0.113.5", "1.2.3.4")) == "203.0.113.5"
+    assert middleware._client_ip(scope("10.0.0.1", "1.2.3.4")) == "1.2.3.4"
+    # Entries left of the nearest untrusted hop are client-supplied
+    assert middleware._client_ip(scope("10.0.0.1", "6.6.6.6, 1.2.3.4, 10.0.0.2")) == "1.2.3.4"
+    assert middleware._client_ip(scope("10.0.0.1", "10.0.0.3")) == "10.0.0.3"
+    assert middleware._client_ip(scope("10.0.0.1")) == "10.0.0.1"
+
+    untrusting = RateLimitMiddleware(None, limiter=RateLimiter(), trusted_proxies=[])
+    assert untrusting._client_ip(scope("10.0.0.1", "1.2.3.4")) == "10.0.0.1"
+
+
+def test_rejected_request_gets_429_with_retry_after_and_cors_headers():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    limiter = RateLimiter(store=MemoryBucketStore(), rules=[RateLimitRule("default", capacity=1, refill_per_second=0.1)])
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, trusted_proxies=[])
+    app.add_middleware(CORSMiddleware, allow_origins=["*"])
+
+    with TestClient(app) as client:
+        headers = {"Origin": "https://example.com"}
+        assert client.get("/ping", headers=headers).status_code == 200
+        response = client.get("/ping", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "10"
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert limiter.metrics() == {"allowed": {"default": 1}, "rejected": {"default": 1}}
+
+
+def test_cors_is_the_outermost_middleware():
+    assert main.app.user_middleware[0].cls is CORSMiddleware
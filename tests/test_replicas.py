@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from billing_app.models.database import SessionLocal, Tenant
+from billing_app.models.replicas import (
+    MemoryWriteStore, ReplicaRouter, _request_writes, record_request_user, replica_router
+)
+
+
+@pytest.fixture
+def router(tmp_path):
+    router = ReplicaRouter(urls=[f"sqlite:///{tmp_path / 'replica.db'}"], sticky_window=5,
+                           write_store=MemoryWriteStore())
+    yield router
+    router.shutdown()
+
+
+def test_write_store_expires_deadlines():
+    store = MemoryWriteStore()
+    store.mark("alice", 0.05)
+    assert store.recent("alice")
+    assert not store.recent("bob")
+    time.sleep(0.1)
+    assert not store.recent("alice")
+
+
+def test_user_who_wrote_reads_from_the_primary_without_a_cookie(router):
+    router.mark_write("alice")
+
+    assert router.stick_to_primary("alice")
+    assert not router.stick_to_primary("bob")
+    primary, replica = router.read_session(router.stick_to_primary("alice")), router.read_session(False)
+    try:
+        assert "read_only" not in primary.info
+        assert replica.info["read_only"]
+    finally:
+        primary.close()
+        replica.close()
+
+
+def test_cookie_still_pins_the_client(router):
+    cookie = router.sticky_cookie().split(";")[0].split("=", 1)[1]
+    assert router.stick_to_primary("bob", cookie)
+    assert not router.stick_to_primary("bob", cookie.rsplit(".", 1)[0] + ".forged")
+
+
+def test_committed_write_is_recorded_for_the_request_user(client, monkeypatch):
+    store = MemoryWriteStore()
+    monkeypatch.setattr(replica_router, "_write_store", store)
+    writes = {}
+    token = _request_writes.set(writes)
+    db = SessionLocal()
+    try:
+        record_request_user("carol")
+        db.add(Tenant(name="Sticky", slug=f"sticky-{time.time_ns()}"))
+        db.commit()
+    finally:
+        db.close()
+        _request_writes.reset(token)
+
+    assert writes["wrote"]
+    assert store.recent("carol")
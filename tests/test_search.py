@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 101}, {"offset": -1}])
+def test_search_rejects_bad_paging(client, make_user, params):
+    headers, _ = make_user()
+    response = client.get("/api/v1/invoices/search", headers=headers, params={"q": "consulting", **params})
+    assert response.status_code == 400
+
+
+def test_search_pages_with_offset(client, make_user):
+    headers, user_id = make_user()
+    for number in ("PAGE-1", "PAGE-2", "PAGE-3"):
+        client.post("/api/v1/invoices", headers=headers, json={
+            "invoice_number": number, "customer_id": user_id, "description": "pagination retainer",
+            "items": [{"description": "Hours", "quantity": "1", "unit_price": "10.00"}],
+        })
+    found = [
+        invoice["id"]
+        for offset in (0, 2)
+        for invoice in client.get("/api/v1/invoices/search", headers=headers,
+                                  params={"q": "pagination", "limit": 2, "offset": offset}).json()
+    ]
+    assert len(found) == len(set(found)) == 3
@@ -0,0 +1,117 @@
+import uuid
+
+import pytest
+
+from billing_app.models.database import Invoice, User
+from billing_app.search.invoice_search import invoice_search
+
+
+def create_invoice(client, headers, customer_id, description="Consulting"):
+    return client.post("/api/v1/invoices", headers=headers, json={
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}",
+        "customer_id": customer_id,
+        "description": description,
+        "items": [{"description": "Hours", "quantity": "2", "unit_price": "50.00"}],
+    })
+
+
+@pytest.fixture
+def tenants(make_user):
+    """Two users who signed up separately, and so own two different tenants"""
+    return make_user(), make_user()
+
+
+def test_invoice_from_another_tenant_is_not_found(client, tenants):
+    (headers_a, user_a), (headers_b, _) = tenants
+    invoice_id = create_invoice(client, headers_a, user_a).json()["id"]
+
+    assert client.get(f"/api/v1/invoices/{invoice_id}", headers=headers_a).status_code == 200
+    assert client.get(f"/api/v1/invoices/{invoice_id}", headers=headers_b).status_code == 404
+    assert client.put(f"/api/v1/invoices/{invoice_id}", headers=headers_b,
+                      json={"description": "Taken over"}).status_code == 404
+
+
+def test_invoice_list_is_scoped_to_tenant(client, tenants):
+    (headers_a, user_a), (headers_b, user_b) = tenants
+    own = create_invoice(client, headers_a, user_a).json()["id"]
+    other = create_invoice(client, headers_b, user_b).json()["id"]
+
+    ids = {invoice["id"] for invoice in client.get("/api/v1/invoices", headers=headers_a).json()}
+    assert own in ids
+    assert other not in ids
+
+
+def test_search_is_scoped_to_tenant(client, tenants):
+    (headers_a, user_a), (headers_b, user_b) = tenants
+    word = f"project{uuid.uuid4().hex[:6]}"
+    own = create_invoice(client, headers_a, user_a, description=f"{word} retainer").json()
+    other = create_invoice(client, headers_b, user_b, description=f"{word} retainer").json()
+
+    for query in (word, other["invoice_number"][4:]):
+        response = client.get("/api/v1/invoices/search", headers=headers_a, params={"q": query})
+        assert response.status_code == 200
+        assert other["id"] not in {invoice["id"] for invoice in response.json()}
+    response = client.get("/api/v1/invoices/search", headers=headers_a, params={"q": word})
+    assert [invoice["id"] for invoice in response.json()] == [own["id"]]
+
+
+def test_search_without_tenant_fails_closed(db):
+    with pytest.raises(RuntimeError):
+        invoice_search.search_ids(db, "consulting")
+
+
+def test_create_invoice_for_customer_in_another_tenant_fails(client, tenants):
+    (headers_a, _), (_, user_b) = tenants
+    response = create_invoice(client, headers_a, user_b)
+    assert response.status_code == 404
+
+
+def test_each_signup_gets_its_own_tenant(client, db, tenants):
+    (_, user_a), (_, user_b) = tenants
+    tenant_a, tenant_b = (db.get(User, user_id).tenant_id for user_id in (user_a, user_b))
+    assert tenant_a != tenant_b
+
+
+def test_invite_joins_the_inviting_tenant(client, tenants, make_user):
+    (headers_a, user_a), (headers_b, _) = tenants
+    invite = client.post("/api/v1/tenants/invites", headers=headers_a)
+    assert invite.status_code == 200, invite.text
+    headers_c, user_c = make_user(invite.json()["invite_token"])
+
+    # The invited user shares the inviter's invoices and can be billed by them; the other tenant can't see either
+    invoice_id = create_invoice(client, headers_a, user_c).json()["id"]
+    assert client.get(f"/api/v1/invoices/{invoice_id}", headers=headers_c).status_code == 200
+    assert client.get(f"/api/v1/invoices/{invoice_id}", headers=headers_b).status_code == 404
+    assert create_invoice(client, headers_b, user_c).status_code == 404
+
+
+def test_register_rejects_a_bad_invite(client, tenants):
+    headers_a, _ = tenants[0]
+    access_token = headers_a["Authorization"].split()[1]
+    for token in ("not-a-token", access_token):
+        response = client.post("/api/v1/auth/register", json={
+            "username": f"user{uuid.uuid4().hex[:8]}", "email": f"{uuid.uuid4().hex[:8]}@example.com",
+            "password": "Passw0rd1", "invite_token": token,
+        })
+        assert response.status_code == 400
+
+
+def test_bulk_import_stamps_tenant(client, db, make_user):
+    headers, user_id = make_user()
+    tenant_id = db.get(User, user_id).tenant_id
+    numbers = [f"IMP-{uuid.uuid4().hex[:8]}" for _ in range(2)]
+    rows = ["invoice_number,customer_id,tax_amount,description,item_description,quantity,unit_price"]
+    rows += [f"{number},{user_id},0,Imported,Hours,1,10.00" for number in numbers]
+
+    upload = client.post("/api/v1/files/upload", headers=headers,
+                         files={"file": ("invoices.csv", "\n".join(rows).encode(), "text/csv")})
+    assert upload.status_code == 200, upload.text
+    # Background tasks finish before the test client returns
+    job = client.post("/api/v1/imports", headers=headers, json={"file_id": upload.json()["id"]})
+    assert job.status_code == 202, job.text
+    job = client.get(f"/api/v1/imports/{job.json()['id']}", headers=headers).json()
+    assert job["status"] == "done"
+    assert job["imported_count"] == 2
+
+    imported = db.query(Invoice.tenant_id).filter(Invoice.invoice_number.in_(numbers)).all()
+    assert [row.tenant_id for row in imported] == [tenant_id, tenant_id]
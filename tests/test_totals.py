@@ -0,0 +1,80 @@
+import uuid
+from decimal import Decimal
+
+import numpy as np
+
+from billing_app.models.schemas import InvoiceItemCreate
+from billing_app.money.totals import INT64_MAX, MAX_AMOUNT, TotalsCalculator, to_minor, to_scaled_quantity
+
+
+def calculate(lines, **tax):
+    quantities = np.array([to_scaled_quantity(q) for q, _ in lines], dtype=object)
+    prices = np.array([to_minor(p) for _, p in lines], dtype=object)
+    return TotalsCalculator.calculate(quantities, prices, np.zeros(len(lines), dtype=np.int64), 1, **tax)
+
+
+def create_invoice(client, headers, customer_id, items, **fields):
+    return client.post("/api/v1/invoices", headers=headers, json={
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}", "customer_id": customer_id, "items": items, **fields
+    })
+
+
+def test_amounts_round_half_up():
+    assert to_minor("2.675") == 268
+    assert to_minor("0.005") == 1
+    assert to_scaled_quantity("1.0005") == 1001
+    assert InvoiceItemCreate(description="x", quantity="1", unit_price="1.005").unit_price == Decimal("1.01")
+
+    # Line totals round half up too: 0.5 x 0.01 = 0.005 and 0.015 x 1.00 = 0.015
+    totals = calculate([("0.5", "0.01"), ("0.015", "1.00")])
+    assert [totals.line_total(i) for i in range(2)] == [Decimal("0.01"), Decimal("0.02")]
+    assert totals.subtotal(0) == Decimal("0.03")
+
+
+def test_tax_rate_rounds_half_up():
+    totals = calculate([("1", "10.00")], tax_rates_bp=np.array([825]))
+    assert totals.tax(0) == Decimal("0.83")
+    assert totals.totals[0] == 1083
+
+
+def test_tax_amount_takes_precedence_over_rate():
+    totals = calculate([("1", "10.00")], tax_amounts=np.array([100]), tax_rates_bp=np.array([825]))
+    assert totals.tax(0) == Decimal("1.00")
+
+
+def test_totals_fall_back_to_python_ints_past_int64():
+    quantity, price = Decimal("999999999.999"), Decimal("9999999999.99")
+    totals = calculate([(quantity, price), (quantity, price)])
+    assert totals.subtotals.dtype == object
+    line = to_minor(quantity * price)
+    assert line * 2 > INT64_MAX
+    assert totals.subtotals[0] == line * 2
+    assert TotalsCalculator.check_limits(totals)[0] is not None
+
+    # Ordinary invoices stay on int64
+    assert calculate([("2", "50.00")]).subtotals.dtype == np.int64
+
+
+def test_create_invoice_rejects_a_mismatched_total(client, make_user):
+    headers, user_id = make_user()
+    items = [{"description": "Hours", "quantity": "2", "unit_price": "50.00"}]
+    response = create_invoice(client, headers, user_id, items, total_amount="99.99")
+    assert response.status_code == 422
+    assert "does not match" in response.json()["detail"]
+
+    response = create_invoice(client, headers, user_id, items, total_amount="100.00")
+    assert response.status_code == 200, response.text
+    assert response.json()["total_amount"] == 100.0
+
+
+def test_create_invoice_rejects_amounts_the_database_cannot_store(client, make_user):
+    headers, user_id = make_user()
+    too_large = str(MAX_AMOUNT + 1)
+    response = create_invoice(client, headers, user_id, [{"description": "x", "quantity": "1", "unit_price": too_large}])
+    assert response.status_code == 422
+
+    # Each line fits, but the subtotal plus tax does not
+    items = [{"description": "x", "quantity": "1", "unit_price": str(MAX_AMOUNT)}]
+    response = create_invoice(client, headers, user_id, items, tax_amount="0.01")
+    assert response.status_code == 422
+    assert "exceeds the maximum amount" in response.json()["detail"]
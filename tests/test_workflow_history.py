@@ -0,0 +1,40 @@
+import uuid
+
+from billing_app.models.database import WorkflowLog
+from billing_app.workflow.engine import WorkflowEngine
+
+
+def test_history_pages_through_logs_from_the_same_second(client, db, make_user):
+    headers, user_id = make_user()
+    invoice_id = client.post("/api/v1/invoices", headers=headers, json={
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}",
+        "customer_id": user_id,
+        "items": [{"description": "Hours", "quantity": "1", "unit_price": "10.00"}],
+    }).json()["id"]
+    for i in range(4):
+        WorkflowEngine.log_action(db, invoice_id, "note", None, None, user_id, f"note {i}")
+    expected = [log_id for (log_id,) in db.query(WorkflowLog.id).filter(
+        WorkflowLog.invoice_id == invoice_id
+    ).order_by(WorkflowLog.id)]
+    assert len(expected) == 5
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/api/v1/invoices/{invoice_id}/history", headers=headers, params=params).json()
+        seen += [log["id"] for log in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_history_rejects_a_malformed_cursor(client, make_user):
+    headers, user_id = make_user()
+    invoice_id = client.post("/api/v1/invoices", headers=headers, json={
+        "invoice_number": f"INV-{uuid.uuid4().hex[:8]}",
+        "customer_id": user_id,
+        "items": [{"description": "Hours", "quantity": "1", "unit_price": "10.00"}],
+    }).json()["id"]
+    response = client.get(f"/api/v1/invoices/{invoice_id}/history", headers=headers, params={"cursor": "???"})
+    assert response.status_code == 400